@@ -527,7 +527,8 @@ class curses_game():
             direction_keys = self.direction_keys['hex']
         else:
             direction_keys = self.direction_keys['square']
-        look_for = ['reveal', 'flag', 'toggle-attention'] + direction_keys
+        look_for = ['reveal', 'flag', 'chord', 'toggle-attention']
+        look_for += direction_keys
         # Receive input from player.
         ch = self.window.getch()
         # Interpret.
@@ -540,8 +541,10 @@ class curses_game():
             else:
                 valid = self.mouse_travel_square(x, y, engine.field)
             if valid:
-                for tmp_command in ('flag', 'reveal'):
-                    for mask in self.cfg['curses-mouse-input'][tmp_command]:
+                for tmp_command in ('flag', 'reveal', 'chord'):
+                    # 'chord' is missing in old configuration files.
+                    masks = self.cfg['curses-mouse-input'].get(tmp_command, [])
+                    for mask in masks:
                         if buttons & mask:
                             command = tmp_command
                     else:
@@ -550,7 +553,7 @@ class curses_game():
         else:
             # Keyboard input:
             for key in look_for:
-                if ch in self.cfg['curses-input'][key]:
+                if ch in self.cfg['curses-input'].get(key, []):
                     command = key
         # Act.
         if command == 'flag':
@@ -565,6 +568,8 @@ class curses_game():
                 curses.reset_prog_mode()    # BUG: see comments above __init__
                 # Clear junk that gets on the screen from impatient players.
                 self.window.redrawwin()
+        elif command == 'chord':
+            engine.chord(self.cursor)
         elif command in direction_keys:
             self.travel(engine.field, command)
         elif command == 'toggle-attention':
@@ -664,24 +669,20 @@ class curses_game():
         except KeyError:
             self.print_char(x, y, 'number', str(digit))
     
-    def print_cell(self, x, y, field, cell):
+    def print_cell(self, x, y, field, index, value):
         '''
         `x` and `y` is the virtual coordinate for the single character
         to be printed.
         
-        `cell` is the cell from the field.
+        `index` is the flat index of the cell in the field and `value`
+        is what `field.get_i(index)` returns.
         
         Introduced in 0.4.15 to reduce code duplication and apply the
         attention mode to numbers with too many mines around them.
         '''
-        value = field.get(cell)
         if value not in self.specials:
             if self.attention_mode:
-                flags = 0
-                for neighour in field.get_neighbours(cell):
-                    if field.get(neighour) == 'F':
-                        flags += 1
-                if flags > value:
+                if field.flagged_neighbours_i(index) > value:
                     self.print_char(x, y, 'attention', str(value))
                     return
             self.print_digit(x, y, value)
@@ -691,6 +692,33 @@ class curses_game():
             else:
                 self.print_char(x, y, self.specials[value])
     
+    def visible_cells(self, field, x, y, width, height):
+        '''
+        Return a list of (coordinate, value) for the cells in the
+        `width` by `height` cells large area of `field` that starts at
+        (`x`, `y`), with a margin of two cells, in the same order as
+        `field.all_cells`.  `value` is what `field.get` returns.
+        
+        Used by `self.print_square` and `self.print_hex` to only print
+        the cells that can be seen.
+        '''
+        left = max(0, x - 2)
+        right = min(field.dimensions[0], x + width + 2)
+        top = max(0, y - 2)
+        bottom = min(field.dimensions[1], y + height + 2)
+        if left >= right or top >= bottom:
+            return []
+        # Page in the tiles of a `chunked_field` before they're needed.
+        if 'page_in' in dir(field):
+            field.page_in((left, top), (right - 1, bottom - 1))
+        # All the values in one call.
+        columns = field.get_region(left, top, right, bottom)
+        return [
+            ((left + x, top + y), value)
+            for x, column in enumerate(columns)
+            for y, value in enumerate(column)
+        ]
+    
     def print_square(self, field):
         '''Helper function for `self.output` for non-hexagonal gametypes.
         
@@ -717,14 +745,19 @@ class curses_game():
         x, y = self.cursor
         self.move_visible_area(2*x+1, y, 3, 1)
         
-        # Print all cells in a field.
-        for cell in field.all_cells():
+        # Print all cells in the visible area, the field may be huge.
+        left, top = self.window_start
+        cells = self.visible_cells(
+            field, left//2, top, self.width//2, self.height
+        )
+        for cell, value in cells:
             x, y = cell
+            index = field.index_of(cell)
             # Print blank grid .
             self.print_char(2*x, y, 'grid', ' ')
             self.print_char(2*x+2, y, 'grid', ' ')
             # Print the actual cell.
-            self.print_cell(2*x+1, y, field, cell)
+            self.print_cell(2*x+1, y, field, index, value)
         # Print the "cursor".
         x, y = self.cursor
         self.print_char(2*x, y, 'cursor-l')
@@ -785,8 +818,13 @@ class curses_game():
         x, y = self.cursor
         self.move_visible_area(fx(x, y), fy(x, y), 6, 3)
         
-        # Print all cells in a field.
-        for cell in field.all_cells():
+        # Print all cells in the visible area, the field may be huge.
+        left, top = self.window_start
+        cells = self.visible_cells(
+            field, left//4, top//2, self.width//4, self.height//2
+        )
+        for cell, value in cells:
+            index = field.index_of(cell)
             x = 2 * (2*cell[0] + 1 + (cell[1] % 2))
             y = 2*cell[1] + 1
             
@@ -806,7 +844,7 @@ class curses_game():
             self.print_char(x, y + 1, 'grid', ' ')
             self.print_char(x + 1, y + 1, 'grid', '/')
             # Print the actual cell.
-            self.print_cell(x, y, field, cell)
+            self.print_cell(x, y, field, index, value)
         
         # Print the "cursor".
         x, y = self.cursor
@@ -1091,8 +1129,8 @@ def arg_input(default):
     game parameters, `user_input` will be True.
     
     `default` is a dictionary that MUST contain these keys:
-    'width', 'height', 'mines', 'gametype', 'flagcount', 'guessless'
-    and 'insult'.
+    'width', 'height', 'mines', 'gametype', 'flagcount', 'guessless',
+    'torus' and 'insult'.
     Their types are specified in the doc-string for `play_game`.
     
     `params` is a dictionary that contains either all of the keys that
@@ -1256,6 +1294,23 @@ without guessing and supports three different game types:
             ]
         )
     )
+    torus = parser.add_mutually_exclusive_group()
+    torus.add_argument(
+        '-t', '--torus', dest='torus', action='store_true',
+        help=(
+            "Wrap around at the edges." + default_s[
+                default['torus']
+            ]
+        )
+    )
+    torus.add_argument(
+        '-T', '--no-torus', dest='notorus', action='store_true',
+        help=(
+            "Ordinary edges." + default_s[
+                not default['torus']
+            ]
+        )
+    )
     insult = parser.add_mutually_exclusive_group()
     insult.add_argument(
         '-r', '--rude', dest='insult', action='store_true',
@@ -1326,6 +1381,12 @@ without guessing and supports three different game types:
     if args.noguessless:
         user_input_required = False
         params['guessless'] = False
+    if args.torus:
+        user_input_required = False
+        params['torus'] = True
+    if args.notorus:
+        user_input_required = False
+        params['torus'] = False
     if args.insult:
         user_input_required = False
         params['insult'] = True
@@ -1355,8 +1416,8 @@ def user_input(default, cursescfg_path):
     displayed by this function.
     
     `default` is a dictionary that MUST contain these keys:
-    'width', 'height', 'mines', 'gametype', 'flagcount', 'guessless'
-    and 'insult'.
+    'width', 'height', 'mines', 'gametype', 'flagcount', 'guessless',
+    'torus' and 'insult'.
     Their types are specified in the doc-string for `play_game`.
     
     `user_input` will return dictionary containing the same keys.
@@ -1394,6 +1455,11 @@ def user_input(default, cursescfg_path):
         'yesno',
         booldefault[default['guessless']]
     )
+    parameters['torus'] = ask(
+        'Wrap around at the edges?',
+        'yesno',
+        booldefault[default['torus']]
+    )
     # MUST ask for guessless mode before polite mode.
     if parameters['guessless']:
         parameters['insult'] = not ask(
@@ -1509,6 +1575,7 @@ def play_game(parameters):
         'gametype'      'moore', 'hex' or 'neumann'
         'flagcount'     A boolean (Show flag count)
         'guessless'     A boolean (no guessing required)
+        'torus'         A boolean (wrap around at the edges)
         'insult'        A boolean (!polite mode)
         'enginecfg'     The path to the configuration file for the
                         game engine.
@@ -1522,6 +1589,9 @@ def play_game(parameters):
     # WORKAROUND for a special bug.
     if parameters['mines'] == 0:      # Test: 42
         parameters['mines'] == 1      # Test: 0
+    # The odd rows of a hexagonal field must line up across the edge.
+    if parameters['torus'] and parameters['gametype'] == 'hex':
+        parameters['height'] += parameters['height'] % 2
     # Don't blame the player when it's not the players fault.
     if not parameters['guessless']:
         parameters['insult'] = False
@@ -1577,6 +1647,7 @@ def main():
         'gametype': 'moore',
         'flagcount': True,
         'guessless': True,
+        'torus': False,
         'insult': True,
     }
     
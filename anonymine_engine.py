@@ -44,6 +44,8 @@ The engine of Anonymine
 
 import os
 import time
+import random
+import binascii
 import signal
 import errno
 import sys
@@ -137,12 +139,15 @@ class hiscores():
         documented somewhere and somehow.
         
         "{mines}@{width}x{height}-{gametype}" + nfc*"+nocount" + ng*"+losable"
+            + torus*"+torus"
         
         <mines>"@"<width>"x"<height>"-"<gametype>["+nocount"]["+losable"]
+            ["+torus"]
         
         And for a lost game, "lost/" is prepended to the paramstring, ie:
         
         "lost/"<mines>"@"<width>"x"<height>"-"<gametype>["+nocount"]["+losable"]
+            ["+torus"]
     
     
     Unicode
@@ -562,6 +567,10 @@ class game_engine():
             cells after initialization, OR initializes the field.
             (Let the player choose the starting point by playing.)
         
+        `engine.chord(coordinate)` reveals every free neighbour of the
+            number at `coordinate` if all its mines have been flagged.
+            (See `chord` in anonymine_fields.generic_field.)
+        
         `engine.init_field(startpoint)` is the method that will place
             the mines and reveals the starting point, from which the
             game CAN be won.
@@ -596,6 +605,9 @@ class game_engine():
             flagcount=          # bool; Count how many flags are left?
             guessless=          # bool; Must be possible to solve without
                                 #       guessing?
+            torus=              # bool; Wrap around at the edges?
+                                #       (The height MUST be even for
+                                #       'hex'.)
         
         As of version 0.0.20, no parameters are mandatory; they all
         have default values.  This may change in the future.
@@ -611,6 +623,7 @@ class game_engine():
             'gametype':  'moore',
             'flagcount': True,
             'guessless': True,
+            'torus':     False,
         }
         for key in default:
             if key not in parameters:
@@ -629,23 +642,84 @@ class game_engine():
         self.n_mines = parameters['mines']
         self.flagcount = parameters['flagcount']
         self.guessless = parameters['guessless']
+        self.torus = parameters['torus']
         if self.gametype == 'hex':
             self.field = fields.hexagonal_field(
                 parameters['width'],
                 parameters['height'],
+                parameters['flagcount'],
+                parameters['torus']
+            )
+        elif self._sparse(area, 'chunk-minarea'):
+            self.field = fields.chunked_field(
+                [parameters['width'], parameters['height']],
+                float(self.n_mines) / area,
+                self.gametype == 'moore',
+                parameters['flagcount']
+            )
+            # The solver can't work on a field that doesn't exist yet.
+            self.guessless = False
+        elif self._sparse(area, 'sparse-minarea'):
+            self.field = fields.sparse_field(
+                [parameters['width'], parameters['height']],
+                self.gametype == 'moore',
                 parameters['flagcount']
             )
         else:
             self.field = fields.generic_field(
                 [parameters['width'], parameters['height']],
                 self.gametype == 'moore',
-                parameters['flagcount']
+                parameters['flagcount'],
+                parameters['torus']
             )
         
         self.game_status = 'pre-game' # play-game game-won game-lost
         
         self.solver = solver.solver()
         self.solver.field = self.field
+        self.solver.mode = self.cfg['init-field'].get(
+            'solver-mode', 'possibilities'
+        )
+    
+    def _sparse(self, area, key):
+        '''(Internal use.)  Uses enginecfg.
+        
+        Should a field with the area `area` be a `fields.sparse_field`
+        (`key` is 'sparse-minarea') or a `fields.chunked_field` (`key`
+        is 'chunk-minarea')?
+        
+        enginecfg['init-field']
+            'sparse-minarea'    int: Optional.  Use sparse fields for
+                                fields with at least this area.
+            'chunk-minarea'     int: Optional.  Use chunked fields for
+                                fields with at least this area.  They
+                                can't be guessless.
+            (Not for hexagonal fields or tori.)
+        '''
+        minarea = self.cfg['init-field'].get(key)
+        if minarea is None or self.torus:
+            return False
+        return area >= minarea
+    
+    def _sample_mines(self, rng, safe):
+        '''(Internal use.)
+        
+        Return the flat indices of `self.n_mines` randomly selected
+        cells that are not in `safe`, chosen with `rng`.  Fewer if
+        there aren't that many cells outside `safe`, `self.n_mines` is
+        then lowered to match so the hiscores count the mines that
+        are actually on the field.
+        
+        Sampling from the range of flat indices doesn't build a list
+        of every cell, which matters for sparse fields.
+        '''
+        n_cells = self.field.n_cells
+        cells = rng.sample(
+            range(n_cells), min(self.n_mines + len(safe), n_cells)
+        )
+        mines = [index for index in cells if index not in safe]
+        self.n_mines = min(self.n_mines, len(mines))
+        return mines[:self.n_mines]
     
     def init_field2(self, startpoint):
         '''(Internal use.)  Uses enginecfg.
@@ -660,14 +734,16 @@ class game_engine():
             'maxtime'   float: Start over after having tried one field
                         for this long.
             'filename'  string: tempfile, filename.format(x)
+            'solver-mode'
+                        string: Optional.  'possibilities' (default)
+                        or 'constraints', see `mode` in
+                        anonymine_solver.solver.
         '''
         def child():
             # The startpoint and its neighbours MUST NOT be mines.
-            safe = self.field.get_neighbours(startpoint) + [startpoint]
-            cells = list(filter(
-                lambda x: x not in safe,
-                self.field.all_cells()
-            ))
+            # Work with flat indices, see `fields.generic_field.reseed_i`.
+            start = self.field.index_of(startpoint)
+            safe = set(self.field.neighbours_i(start) + [start])
             # Set up handler for kill signal.
             # Solved bug:
             #   There was a small possibility that another slave would
@@ -688,15 +764,15 @@ class game_engine():
                 signal.signal(signal.SIGCONT, die)
             else:
                 signal.signal(signal.SIGTERM, die)
+            # Every child gets its own generator seeded from os.urandom,
+            # a call to os.urandom per cell per attempt is too slow.
+            rng = random.Random(int(binascii.hexlify(os.urandom(32)), 16))
             # Solve
             solved = False
             while not solved:
                 # Choose self.n_mines randomly selected mines.
-                cells.sort(key=lambda x: os.urandom(1))
-                mines = cells[:self.n_mines]
-                self.field.clear()
-                self.field.fill(mines)
-                self.field.reveal(startpoint)
+                mines = self._sample_mines(rng, safe)
+                self.field.reseed_i(mines, start)
                 solved = self.solver.solve()[0]
             # Store the mine coordinates in the tempfile.
             try:
@@ -710,7 +786,7 @@ class game_engine():
                         f = open(filename.format(os.getpid()), 'w')
             except:
                 raise security_alert('Exploit attempt (tempfile)!')
-            for x, y in mines:
+            for x, y in map(self.field.coordinate_of, mines):
                 f.write('{0} {1}\n'.format(x, y))
             f.close()
         # FUNCTION STARTS HERE.
@@ -813,6 +889,8 @@ class game_engine():
         for line in lines:
             mine = list(map(int, line.split(' ')))
             mines.append(mine)
+        # The slave may have placed fewer mines than asked for.
+        self.n_mines = len(mines)
         # Fill the field with the mines.
         self.field.fill(mines)
         self.field.reveal(startpoint)
@@ -825,21 +903,24 @@ class game_engine():
             It will place the mines by itself when not in guessless
             mode.
         '''
-        if self.guessless:
+        if isinstance(self.field, fields.chunked_field):
+            # The mines are placed as the tiles are generated.
+            start = self.field.index_of(startpoint)
+            self.field.clear()
+            self.field.set_start(start)
+            self.field.reveal_i(start)
+        elif self.guessless:
             # Wrap in the best version.
             self.init_field2(startpoint)
         else:
-            safe = self.field.get_neighbours(startpoint) + [startpoint]
-            cells = list(filter(
-                lambda x: x not in safe,
-                self.field.all_cells()
-            ))
+            start = self.field.index_of(startpoint)
+            safe = set(self.field.neighbours_i(start) + [start])
             # Choose self.n_mines randomly selected mines.
-            cells.sort(key=lambda x: os.urandom(1))
-            mines = cells[:self.n_mines]
+            rng = random.Random(int(binascii.hexlify(os.urandom(32)), 16))
+            mines = self._sample_mines(rng, safe)
             self.field.clear()
-            self.field.fill(mines)
-            self.field.reveal(startpoint)
+            self.field.fill_i(mines)
+            self.field.reveal_i(start)
     
     def flag(self, coordinate):
         '''Automatic flag/unflag at `coordinate`.
@@ -862,6 +943,14 @@ class game_engine():
         else:
             assert False, "game_status not in ('play-game', 'in-game')"
     
+    def chord(self, coordinate):
+        '''Reveal the free neighbours of the number at `coordinate`.
+        
+        Does nothing before the field has been initialized.
+        '''
+        if self.game_status == 'play-game':
+            self.field.chord(coordinate)
+    
     def play_game(self, interface):
         '''bool_won, float_time_spent = play_game(interface)
         
@@ -890,12 +979,18 @@ class game_engine():
         # Won? Time?
         game_won = self.game_status == 'game-won'
         delta_time = time.time() - self.start
+        chunked = isinstance(self.field, fields.chunked_field)
+        sparse = isinstance(self.field, fields.sparse_field)
         # Show everything.
-        if self.game_status == 'game-lost':
+        if self.game_status == 'game-lost' and not sparse:
             # This takes a long time in some really weird configurations.
             # anonymine -m 1 -s 100x100
             for cell in self.field.all_cells():
                 self.field.reveal(cell)
+        elif self.game_status == 'game-lost' and not chunked:
+            # Revealing every cell would store every cell, show the mines.
+            for index in sorted(self.field.mined):
+                self.field.reveal_i(index)
         interface.output(self)
         
         # Create a proper paramstring for the hiscores object.
@@ -910,8 +1005,13 @@ class game_engine():
             paramstring += '+nocount'
         if not self.guessless:
             paramstring += '+losable'
+        if self.torus:
+            paramstring += '+torus'
         mines_left = 0
-        if not game_won:
+        if not game_won and sparse:
+            # Can't reveal everything, but the counters know.
+            mines_left = self.field.n_mines - self.field.correct_flags
+        elif not game_won:
             # Count the remaining mines. Flags != mines.
             for cell in self.field.all_cells():
                 if self.field.get(cell) == 'X':
@@ -920,7 +1020,7 @@ class game_engine():
             if mines_left == 0:
                 mines_left = self.n_mines * 42
             # Somehow missed more than 20% of all mines??
-            if self.field.flags_left is not None:
+            if self.field.flags_left is not None and self.n_mines:
                 fail = float(mines_left - self.field.flags_left)/self.n_mines
                 if fail > .20:
                     mines_left = self.n_mines * 42
@@ -934,6 +1034,9 @@ class game_engine():
             )
         else:
             hs = hiscores_dummy()
+        if chunked:
+            # Remove the evicted tiles.
+            self.field.close()
         # NOTICE: This used to return game_won, delta_time
         
         # Do this last, so the player won't unfairly get a terrible time.
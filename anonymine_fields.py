@@ -35,8 +35,400 @@ Field classes for Anonymine
     generic_field           multidimensional with either Moore or von
                             Neumann neighbourhoods.
     hexagonal_field         Two dimensional with 6 neighbours per cell.
+    bitboard_field          Two dimensional `generic_field` that uses
+                            integers as bitboards for `fill` and
+                            `reveal`.
+    graph_field             Any shape, from an adjacency list.
+    sparse_field            `generic_field` for huge fields with few
+                            mines.
+    chunked_field           `sparse_field` split into tiles that are
+                            generated when needed, for fields of any
+                            size.
+
+The neighbourhoods of a geometry (the dimensions and the kind of
+neighbourhood) are compiled once into a `_topology` that is shared by
+every field with that geometry and survives `clear`.
+
+Fields can be saved with `generic_field.dumps` or `generic_field.save`
+and loaded with `loads` or `load`.
+
+`generic_field.share` puts a field in shared memory for worker
+processes, see `field_image` and `attach`.
 '''
 
+
+class _topology():
+    '''
+    The neighbourhoods of all cells in a field compiled into flat
+    tables (compressed sparse rows).
+    
+        self.cells
+            List of all coordinates, indexed by flat cell number.
+            Created when it's first used if the topology was created
+            with a function for it.
+        
+        self.n_cells
+            The number of cells.
+        
+        self.offsets = array.array('l', ...)
+        self.targets = array.array('l', ...)
+            The flat indices of the neighbours of the cell with the
+            flat index `i` are `targets[offsets[i]:offsets[i+1]]`.
+        
+        self.max_degree
+            The highest number of neighbours of any cell.
+        
+        self.degrees = array.array('l', ...)
+            The number of neighbours of each cell.
+        
+        self.blank_bits
+            `n_cells` zero bytes for resetting bytearrays in place.
+        
+        self.incoming()
+            The topology with every neighbourhood reversed.
+        
+        self.second_neighbour_indices(index)
+            The neighbours of the neighbours of a cell.
+        
+        self.zobrist()
+            The keys for the Zobrist hashes of the fields.
+    
+    The topologies of the built-in geometries are created with
+    `_shared_topology`.  Topologies MUST NOT be modified after being
+    created.
+    '''
+    def __init__(self, cells, neighbours, symmetric=False):
+        '''
+        `cells` is the list of all coordinates, or a function that
+        returns it.  The function is called when `self.cells` is first
+        used, many fields never need the coordinates.
+        
+        `neighbours` is an iterable of lists of flat indices; the
+        neighbours of each cell in the same order as `cells`.
+        
+        `symmetric` MAY be True if every cell is a neighbour of its
+        neighbours.
+        '''
+        if callable(cells):
+            self._make_cells = cells
+        else:
+            self.cells = cells
+        self.offsets = array.array('l', [0])
+        self.targets = array.array('l')
+        self.degrees = array.array('l')
+        self.max_degree = 0
+        for row in neighbours:
+            self.targets.extend(row)
+            self.offsets.append(len(self.targets))
+            self.degrees.append(len(row))
+            if len(row) > self.max_degree:
+                self.max_degree = len(row)
+        n = self.n_cells = len(self.offsets) - 1
+        self.lists = [None] * n
+        self.index_lists = [None] * n
+        self.second_lists = [None] * n
+        self.numpy_tables = None
+        self.blank_bits = bytes(bytearray(n))
+        if symmetric:
+            self._incoming = self
+        else:
+            self._incoming = None
+        self._zobrist = None
+        self._zobrist_arrays = None
+    
+    def __getattr__(self, name):
+        if name == 'cells' and '_make_cells' in self.__dict__:
+            self.cells = self._make_cells()
+            return self.cells
+        raise AttributeError(name)
+    
+    def incoming(self):
+        '''
+        Return a topology where the neighbours of a cell are the cells
+        that have it as a neighbour.  Created on the first call.
+        '''
+        if self._incoming is None:
+            rows = [[] for index in range(self.n_cells)]
+            for index in range(self.n_cells):
+                start, stop = self.offsets[index], self.offsets[index+1]
+                for neighbour in self.targets[start:stop]:
+                    rows[neighbour].append(index)
+            self._incoming = _topology(lambda: self.cells, rows)
+        return self._incoming
+    
+    def zobrist(self):
+        '''
+        Return (keys, multipliers), created on the first call.
+        
+        `keys` is a list of a random 64 bit integer for every cell.
+        `multipliers` is a list of a random odd 64 bit integer for
+        every state code (see `generic_field.state`), except that the
+        code for free cells has zero.
+        
+        The key of a cell in a state is
+            keys[index] * multipliers[code] & _zobrist_mask
+        
+        The keys are generated from a fixed seed, so they are the same
+        for the same geometry in every process.
+        '''
+        if self._zobrist is None:
+            n = self.n_cells
+            rng = random.Random(_zobrist_seed)
+            keys = []
+            if n:
+                # One call to getrandbits is much faster than n calls.
+                digits = '{0:0{1}x}'.format(rng.getrandbits(64 * n), 16 * n)
+                keys = list(struct.unpack(
+                    '>{0}Q'.format(n), binascii.unhexlify(digits)
+                ))
+            multipliers = [
+                rng.getrandbits(64) | 1 for code in range(self.max_degree + 4)
+            ]
+            multipliers[self.max_degree + 1] = 0    # S_FREE
+            self._zobrist = keys, multipliers
+        return self._zobrist
+    
+    def zobrist_arrays(self):
+        '''NumPy only.  `zobrist` as arrays of uint64.'''
+        if self._zobrist_arrays is None:
+            keys, multipliers = self.zobrist()
+            self._zobrist_arrays = (
+                numpy.array(keys, dtype=numpy.uint64),
+                numpy.array(multipliers, dtype=numpy.uint64),
+            )
+        return self._zobrist_arrays
+    
+    def neighbour_indices(self, index):
+        '''
+        Return a list of the flat indices of the neighbours to the cell
+        with the flat index `index`.
+        
+        The list is created on the first call and then shared, the
+        caller MUST NOT modify it.
+        '''
+        v = self.index_lists[index]
+        if v is None:
+            v = self.index_lists[index] = list(
+                self.targets[self.offsets[index]:self.offsets[index+1]]
+            )
+        return v
+    
+    def second_neighbour_indices(self, index):
+        '''
+        Return a list of the flat indices of the neighbours of the
+        neighbours of the cell with the flat index `index`, without
+        the cell itself, in the order they are first found.
+        
+        The list is created on the first call and then shared, the
+        caller MUST NOT modify it.
+        '''
+        v = self.second_lists[index]
+        if v is None:
+            v = self.second_lists[index] = _second_neighbours(
+                self.neighbour_indices, index
+            )
+        return v
+    
+    def gather(self, indices):
+        '''
+        NumPy only.  Return the flat indices of the neighbours to all
+        cells in the NumPy array `indices` (one common bunch with
+        duplicates).
+        '''
+        if self.numpy_tables is None:
+            self.numpy_tables = (
+                numpy.array(self.offsets, dtype=numpy.intp),
+                numpy.array(self.targets, dtype=numpy.intp),
+            )
+        offsets, targets = self.numpy_tables
+        starts = offsets[indices]
+        counts = offsets[indices + 1] - starts
+        # Position in `targets` = position in the output + a per-row shift.
+        shift = numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts)
+        return targets[numpy.arange(len(shift)) + shift]
+    
+    def neighbours(self, index):
+        '''
+        Return a list of the coordinates of the neighbours to the cell
+        with the flat index `index`.
+        
+        The list is created on the first call and then shared, the
+        caller MUST NOT modify it.
+        '''
+        v = self.lists[index]
+        if v is None:
+            cells = self.cells
+            v = self.lists[index] = [
+                cells[i] for i in self.neighbour_indices(index)
+            ]
+        return v
+
+
+def _second_neighbours(neighbours, index):
+    '''
+    `_topology.second_neighbour_indices` for a function `neighbours`
+    that returns the list of neighbours of a flat index.
+    '''
+    seen = set([index])
+    cells = []
+    for neighbour in neighbours(index):
+        for cell in neighbours(neighbour):
+            if cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+    return cells
+
+
+_topologies = {}
+
+def _shared_topology(key, build):
+    '''
+    Return the topology identified by the hashable `key`, calling
+    `build()` to create it only if it doesn't exist yet.
+    '''
+    try:
+        return _topologies[key]
+    except KeyError:
+        topology = _topologies[key] = build()
+        return topology
+
+
+def _generic_moves(dimensions, moore):
+    '''
+    Return (strides, deltas, moves) for the neighbourhoods of a
+    `generic_field`:
+    
+        strides     The flat index multiplier of each axis.
+        deltas      Relative positions of the neighbours.
+        moves       (checks, step) for each delta, where `checks` is
+                    the list of (axis, d) pairs that need to be checked
+                    against the edges and `step` is the change in flat
+                    index.
+    '''
+    strides = []
+    product = 1
+    for size in reversed(dimensions):
+        strides.insert(0, product)
+        product *= size
+    # Relative positions of the neighbours, in the same order as
+    # `get_neighbours` has always listed them:  Moore neighbourhoods
+    # vary the first axis fastest, von Neumann neighbourhoods are
+    # listed axis by axis.
+    if moore:
+        deltas = [()]
+        for size in dimensions:
+            deltas = [delta + (d,) for d in (-1, 0, 1) for delta in deltas]
+        deltas.remove((0,) * len(dimensions))
+    else:
+        deltas = []
+        for axis in range(len(dimensions)):
+            for d in (-1, 1):
+                delta = [0] * len(dimensions)
+                delta[axis] = d
+                deltas.append(tuple(delta))
+    moves = []
+    for delta in deltas:
+        checks = [(axis, d) for axis, d in enumerate(delta) if d]
+        step = sum([d * stride for d, stride in zip(delta, strides)])
+        moves.append((checks, step))
+    return strides, deltas, moves
+
+
+def _generic_topology(dimensions, moore, torus=False):
+    '''
+    Compile the topology of a `generic_field`.
+    
+    Every position along an axis has an edge mask:  1 at the lower
+    edge, 2 at the upper edge, 3 if the axis is one cell long.  The
+    steps to the neighbours only depend on the masks of a cell, so
+    they are computed once for each combination of masks, and
+    the neighbours of a cell are its index plus the steps.  The cost
+    per cell doesn't grow with the number of dimensions, only with
+    the number of neighbours.
+    '''
+    strides, deltas, moves = _generic_moves(dimensions, moore)
+    masks = [
+        [int(c == 0) | int(c == size - 1) << 1 for c in range(size)]
+        for size in dimensions
+    ]
+    # A wrapped axis shorter than three cells has neighbours twice.
+    repeats = torus and min(dimensions) < 3
+    tables = {}
+    def steps_for(edges):
+        steps = []
+        for checks, step in moves:
+            for axis, d in checks:
+                if edges[axis] & (1 if d < 0 else 2):
+                    if not torus:
+                        break
+                    # Wrap around.
+                    step -= d * dimensions[axis] * strides[axis]
+            else:
+                steps.append(step)
+        tables[edges] = steps
+        return steps
+    def rows():
+        index = 0
+        for edges in itertools.product(*masks):
+            try:
+                steps = tables[edges]
+            except KeyError:
+                steps = steps_for(edges)
+            if repeats:
+                row = []
+                for step in steps:
+                    _add_neighbour(row, index, index + step)
+            else:
+                row = [index + step for step in steps]
+            yield row
+            index += 1
+    def cells():
+        return list(itertools.product(*[range(size) for size in dimensions]))
+    return _topology(cells, rows(), True)
+
+
+def _add_neighbour(row, index, neighbour):
+    '''
+    Append `neighbour` to `row` (the neighbours of `index`) unless it
+    is already there or is the cell itself, which happens when a
+    wrapped axis is shorter than three cells.
+    '''
+    if neighbour != index and neighbour not in row:
+        row.append(neighbour)
+
+
+def _hexagonal_topology(width, height, torus=False):
+    '''Compile the topology of a `hexagonal_field`.'''
+    cells = [(x, y) for x in range(width) for y in range(height)]
+    def rows():
+        for x, y in cells:
+            if y % 2:
+                neighbours = [
+                        (x, y-1), (x+1, y-1),
+                    (x-1, y),               (x+1, y),
+                        (x, y+1), (x+1, y+1)
+                ]
+            else:
+                neighbours = [
+                        (x-1, y-1), (x, y-1),
+                    (x-1, y),               (x+1, y),
+                        (x-1, y+1), (x, y+1)
+                ]
+            if torus:
+                row = []
+                for nx, ny in neighbours:
+                    neighbour = nx % width * height + ny % height
+                    _add_neighbour(row, x*height + y, neighbour)
+                yield row
+                continue
+            yield [
+                x*height + y
+                for x, y in neighbours
+                if 0 <= x < width and 0 <= y < height
+            ]
+    return _topology(cells, rows(), True)
+
+
 class generic_field():
     '''
     Rectangular multidimensional minesweeper field with Moore or
@@ -53,13 +445,24 @@ class generic_field():
             What is there at `coordinate`.
             'F' (flag), 'X' (revealed mine), None (free), int number
         
+        get_region(self, x0, y0, x1, y1)
+            What is there in a rectangle of a two dimensional field.
+        
+        export_state(self)
+            The whole field as an array of state codes.
+        
         flag(self, coordinate)
         unflag(self, coordinate)
             (un)Flag the cell at `coordinate` and de-/increase the flag
             count.
         
         reveal(self, coordinate)
-            Reveal the free cell at `coordinate`
+            Reveal the free cell at `coordinate`, returns a list of the
+            newly revealed cells.
+        
+        chord(self, coordinate)
+            Reveal the free neighbours of a number that has all its
+            mines flagged.
         
         get_callback(self, function_name)
         set_callback(self, function_name, function, argument)
@@ -69,6 +472,28 @@ class generic_field():
         fill(self, mines)
             Place all mines.
         
+        reseed(self, mines, startpoint)
+            `clear`, `fill` and `reveal` in one cheap operation.
+        
+        snapshot(self)
+        restore(self, token)
+        discard(self, token)
+            Checkpoint the state of the game and go back to it.
+        
+        set_journal(self, enabled)
+        drain_changes(self)
+            Get the list of cells that have changed since the last
+            call, instead of looking at every cell.
+        
+        dumps(self)
+        save(self, filename)
+            Save the field in a compact binary format, see `loads` and
+            `load` in this module.
+        
+        share(self)
+            Copy the field into shared memory for other processes, see
+            `field_image`.
+        
         clear(self)
             Reinitialize the field.  All cells will be free cells and
             all mines will be removed.
@@ -76,10 +501,63 @@ class generic_field():
         get_neighbours(self, coordinate)
         all_cells(self)
         
+        frontier(self)
+            List of the revealed cells that have free neighbours.
+        deserted(self)
+            List of the free cells that are not neighbours of any
+            revealed cell.
+        
+        state_hash(self, cells=None)
+        layout_hash(self)
+            64 bit Zobrist hashes of what is visible on the field and
+            of where the mines are, for keying caches without
+            serializing the field.
+        
         flags_left
             Actually an attribute.
     
     
+    Flat index API
+    ==============
+    
+        Every cell also has a flat index, an integer in
+        range(field.n_cells).  These methods are the same as the ones
+        above, but take and return flat indices instead of coordinates.
+        They are meant for hot loops (the solver and the renderers).
+        
+        get_i(self, index)
+        get_many(self, indices)
+        flag_i(self, index)
+        unflag_i(self, index)
+        reveal_i(self, index)
+        chord_i(self, index)
+        neighbours_i(self, index)
+            The list of neighbours is shared, it MUST NOT be modified.
+        second_neighbours_i(self, index)
+            The neighbours of the neighbours, for the solver.  Also
+            shared.
+        frontier_i(self)
+        deserted_i(self)
+            The sets are kept up to date by `flag`, `unflag`,
+            `reveal` and `restore`; they are shared and MUST NOT be
+            modified.
+        flagged_neighbours_i(self, index)
+        free_neighbours_i(self, index)
+            Counted as they change, O(1).
+        conflict_i(self, index)
+            Is the number at `index` over-flagged or unsatisfiable?
+        incoming_i(self, index)
+            The cells that have the cell at `index` as a neighbour.
+        state_hash_i(self, indices=None)
+        
+        index_of(self, coordinate)
+        coordinate_of(self, index)
+            Convert between coordinates and flat indices.
+        
+        n_cells
+            Actually an attribute.
+    
+    
     Coordinate system
     =================
     
@@ -103,28 +581,84 @@ class generic_field():
         The field is one dimensional on the inside
         ==========================================
         
-            self.field = [...]
-                Single dimensional field.
-                List of raw cells.
-                The coordinates in the multidimensional fields
-                are interpreated as numbers of an irregular base.
-                Ex
-                    width = 60 (minutes), heihgt = 24 (hours)
-                    one_dimensional_coordinate = 60*hour + minute
+            The cells are numbered with a single flat index.
+            The coordinates in the multidimensional fields are
+            interpreated as numbers of an irregular base.
+            Ex
+                width = 60 (minutes), heihgt = 24 (hours)
+                one_dimensional_coordinate = 60*hour + minute
+            
+            The state of the cells is kept in parallel arrays indexed
+            by the flat index, rather than as one list per cell:
+            
+            self.visible = bytearray(...)
+            self.flagged = bytearray(...)
+            self.mined = bytearray(...)
+                0 or 1.
+            
+            self.numbers = array.array(...)
+                The number of neighbouring mines.
+            
+            self.state = array.array(...)
+                The external value of each cell (see `get`) encoded
+                as a small integer:
+                    0 ... self.max_neighbours   A revealed number.
+                    self.S_FREE                 None
+                    self.S_FLAG                 'F'
+                    self.S_MINE                 'X'
+                `self.decode[code]` translates it back.
+            
+            self.topology
+                The shared neighbour tables, see `_topology`.
+            
+            self.accelerated
+                True if `fill` and `reveal` will use NumPy for the
+                whole-board work.  Defaults to True if
+                NumPy could be imported and the field has at least
+                `_numpy_threshold` cells (NumPy's overhead isn't worth
+                it on small fields); set it to False to use the pure
+                Python code.
+            
+            self.n_mines
+            self.correct_flags
+            self.wrong_flags
+                Running counts kept by `fill`, `flag` and `unflag`, so
+                that the win can be double checked without looking at
+                every cell.
+            
+            self._undo_log
+                None, or a list of ('flag', index) and ('reveal',
+                [index, ...]) while there are `self._snapshots`.
+            
+            self._journal
+                None, or a list of (index, old_state, new_state).
+            
+            self._free_neighbours = array.array(...)
+            self._flagged_neighbours = array.array(...)
+                The number of free and flagged neighbours of each
+                cell, see `conflict_i`.
+            
+            self._frontier
+                Set of the visible cells with free neighbours.
             
-            self.K_VISIBLE, self.K_FLAG, self.K_MINE, self.K_NUMER,
-            self.K_CACHE_N1, self.K_VALUE
-                Constants; indices for the items in the raw cell
-                lists.
+            self._deserted
+                None, or the set of free cells that are not neighbours
+                of visible cells.  It is built by the first call to
+                `deserted_i` after `clear`, every cell is deserted
+                before that.
             
-            _set_raw(coordinate, index, value)
-            _get_raw(coordinate)
-                PFO
+            self._hash
+            self._layout_hash
+                The Zobrist hashes, updated for every cell that changes
+                (see `state_hash`).
             
-            This system is used instead of the old one with the
-            `_deref` method.  The `_deref` method had the disadvantage
-            that things got weird if was used more than once per
-            function.
+            _update(index)
+                Recompute `self.state[index]` after `self.visible`,
+                `self.flagged` or `self.mined` has been modified.
+            
+            This system replaces the old one with a six element list
+            for every cell, which made `clear` expensive and the
+            fields huge.
             
             self.dimensions
                 size
@@ -132,11 +666,12 @@ class generic_field():
             self.N_DIMENSIONS
             self.dimension_multiplier = [...]
                 These are generated for performance reasons.
+                Integer strides:  index = sum(coordinate * multiplier)
         
 
     '''
     
-    def __init__(self, dimensions, moore=True, flagcount=True):
+    def __init__(self, dimensions, moore=True, flagcount=True, torus=False):
         '''
         `dimensions` is a list of the sizes for each dimension.
         Eg. [width, height, depth, fourth] or [width, height]
@@ -152,17 +687,15 @@ class generic_field():
             (Neighbours only at the sides in 2D, and only at the
             surfaces in 3D, etc.)
             neighbours = 2*dimensions
-        '''
-        self.K_VISIBLE = 0      # bool
-        self.K_FLAG = 1         # bool
-        self.K_MINE = 2         # bool
-        self.K_NUMBER = 3       # int
-        self.K_CACHE_N = 4      # None or list
-        self.K_VALUE = 5        # See `get`.
         
+        If `torus` is True, the field wraps around at every edge, so
+        that every cell has a full neighbourhood (except in tiny
+        fields where a neighbour would be counted twice).
+        '''
         self.dimensions = dimensions
         self.moore = moore
         self.flagcount = flagcount
+        self.torus = torus
         
         self.callbacks = {
             'input': (None, None),
@@ -176,79 +709,105 @@ class generic_field():
         for x in dimensions:
             product *= x
         for x in dimensions:
-            product /= x
+            product //= x
             self.dimension_multiplier.append(product)
         
+        self.topology = _shared_topology(
+            ('generic', tuple(dimensions), bool(moore), bool(torus)),
+            lambda: _generic_topology(list(dimensions), moore, torus)
+        )
+        self._init_storage()
+    
+    def _init_storage(self):
+        '''Choose the state encoding and create the arrays.
+        
+        `self.topology` MUST have been set.
+        '''
+        max_neighbours = self.max_neighbours = self.topology.max_degree
+        self.S_FREE = max_neighbours + 1
+        self.S_FLAG = max_neighbours + 2
+        self.S_MINE = max_neighbours + 3
+        self.decode = list(range(max_neighbours + 1)) + [None, 'F', 'X']
+        self.accelerated = (
+            numpy is not None and self.topology.n_cells >= _numpy_threshold
+        )
+        # Numbers and states share the smallest sufficient type.
+        for typecode in 'BHL':
+            if self.S_MINE < 1 << (8 * array.array(typecode).itemsize):
+                self.typecode = typecode
+                break
+        # For resetting the arrays in place, see `reseed`.
+        n = self.topology.n_cells
+        self._blank_numbers = array.array(self.typecode, [0]) * n
+        self._blank_state = array.array(self.typecode, [self.S_FREE]) * n
+        self._blank_free = array.array(self.typecode, self.topology.degrees)
+        self._journal = None
         self.clear()
     
     def clear(self):
         '''Clear the field and reset the flags left count.
         '''
-        # NOTICE: This function MUST work when self.field and self.flags_left
-        # are undefined.
-        self.free_cells = 1
-        for size in self.dimensions:
-            self.free_cells *= size
-        self.field = []
-        for i in range(self.free_cells):
-            self.field.append(list((False, False, False, 0, None, None)))
+        # NOTICE: This function MUST work when the arrays and
+        # self.flags_left are undefined.
+        if self._journal is not None:
+            self._journal_reset()
+        self.free_cells = n = self.n_cells = self.topology.n_cells
+        self.visible = bytearray(n)
+        self.flagged = bytearray(n)
+        self.mined = bytearray(n)
+        self.numbers = array.array(self.typecode, [0]) * n
+        self.state = array.array(self.typecode, [self.S_FREE]) * n
+        self._free_neighbours = self._blank_free[:]
+        self._flagged_neighbours = self._blank_numbers[:]
+        self._frontier = set()
+        self._deserted = None
+        self._hash = 0
+        self._layout_hash = 0
+        self.n_mines = 0
+        self._mine_indices = []
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        self._undo_log = None
+        self._snapshots = []
         if self.flagcount:
             self.flags_left = 0
         else:
             self.flags_left = None
     
-    def _get_raw(self, coordinate):
-        '''Return the internal values of a cell.
+    def index_of(self, coordinate):
+        '''Return the flat index of the cell at `coordinate`.
         
         `coordinate` is an external (multidimensional) coordinate.
-        
-        Return a list of 6 elements:
-        self.K_VISIBLE = 0      # bool
-        self.K_FLAG = 1         # bool
-        self.K_MINE = 2         # bool
-        self.K_NUMBER = 3       # int
-        self.K_CACHE_N = 4      # None or list
-        self.K_VALUE = 5        # See `get`.
-        '''
-        i = index = 0
-        while i < self.N_DIMENSIONS:
-            index += coordinate[i] * self.dimension_multiplier[i]
-            i += 1
-        return self.field[int(index)]
+        '''
+        return sum(map(operator.mul, coordinate, self.dimension_multiplier))
+    
+    def coordinate_of(self, index):
+        '''Return the coordinate of the cell with the flat index `index`.
+        '''
+        return self.topology.cells[index]
     
-    def _set_raw(self, coordinate, element, value):
-        '''Set an internal value of a cell and recompute its value.
+    def _update(self, index):
+        '''Recompute the external value of the cell at `index`.
         
-        See `_get_raw`.
+        See `get`.
         '''
-        def internal_get():
-            cell = self._get_raw(coordinate)
-            assert not (cell[self.K_VISIBLE] and cell[self.K_FLAG])
-            if cell[self.K_FLAG]:
-                return 'F'
-            if cell[self.K_VISIBLE]:
-                if cell[self.K_MINE]:
-                    return 'X'
-                else:
-                    return cell[self.K_NUMBER]
+        assert not (self.visible[index] and self.flagged[index])
+        if self.flagged[index]:
+            self.state[index] = self.S_FLAG
+        elif self.visible[index]:
+            if self.mined[index]:
+                self.state[index] = self.S_MINE
             else:
-                return None
-        i = index = 0
-        while i < self.N_DIMENSIONS:
-            index += coordinate[i] * self.dimension_multiplier[i]
-            i += 1
-        index = int(index)
-        self.field[index][element] = value
-        self.field[index][self.K_VALUE] = internal_get()
+                self.state[index] = self.numbers[index]
+        else:
+            self.state[index] = self.S_FREE
     
     def _call(self, function_name):
         if function_name == 'win':
-            # Double check that the game was won.
-            for cell in self.all_cells():
-                _a, flagged, is_mine, _d, _e, _f = self._get_raw(cell)
-                if flagged ^ is_mine:
-                    function_name = 'lose'
-                    break
+            # Double check that the game was won: every mine and nothing
+            # else has been flagged.
+            if self.wrong_flags or self.correct_flags != self.n_mines:
+                function_name = 'lose'
         function, argument = self.callbacks[function_name]
         if function is not None:
             function(self, argument)
@@ -298,11 +857,52 @@ class generic_field():
             'X'                         This cell is a revealed mine.
                                         Game over.
         '''
-        i = index = 0
-        while i < self.N_DIMENSIONS:
-            index += coordinate[i] * self.dimension_multiplier[i]
-            i += 1
-        return self.field[int(index)][self.K_VALUE]
+        return self.decode[self.state[
+            sum(map(operator.mul, coordinate, self.dimension_multiplier))
+        ]]
+    
+    def get_i(self, index):
+        '''`get` for flat indices.'''
+        return self.decode[self.state[index]]
+    
+    def get_many(self, indices):
+        '''Return a list of the values (see `get`) of the cells at
+        the flat indices in `indices`.
+        '''
+        return list(map(
+            self.decode.__getitem__, map(self.state.__getitem__, indices)
+        ))
+    
+    def get_region(self, x0, y0, x1, y1):
+        '''
+        Return the values (see `get`) of the cells from (`x0`, `y0`) up
+        to but not including (`x1`, `y1`) in a two dimensional field,
+        as a list of columns:
+            field.get_region(x0, y0, x1, y1)[x - x0][y - y0]
+        
+        The region is clipped to the field.
+        '''
+        assert self.N_DIMENSIONS == 2
+        width, height = self.dimensions
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, width), min(y1, height)
+        # A column is a run of flat indices.
+        stride = self.dimension_multiplier[0]
+        return [
+            self.get_many(range(x*stride + y0, x*stride + y1))
+            for x in range(x0, x1)
+        ]
+    
+    def export_state(self):
+        '''
+        Return a copy of the whole field as an array.array of the
+        state codes of the cells in flat index order.
+        `field.decode[code]` is the value `get` would return.
+        
+        It's as compact as the field itself, usually one byte per cell,
+        and cheap to pass to another process.
+        '''
+        return self.state[:]
     
     def flag(self, coordinate, unflag=False):
         '''
@@ -310,14 +910,23 @@ class generic_field():
         `self.flags_left`, unless the cell already is flagged or is
         unflaggable.
         '''
-        cell = self._get_raw(coordinate)
+        self.flag_i(self.index_of(coordinate), unflag)
+    
+    def flag_i(self, index, unflag=False):
+        '''`flag` for flat indices.'''
         # Only invisible (free or flagged) cell can be flagged or unflagged.
-        if not cell[self.K_VISIBLE]:
+        if not self.visible[index]:
             # No double-flag or double-unflag.
-            if cell[self.K_FLAG] == bool(unflag):
+            if bool(self.flagged[index]) == bool(unflag):
                 # Don't unflag too many.
                 if self.flags_left or unflag or self.flags_left is None:
-                    self._set_raw(coordinate, self.K_FLAG, not unflag)
+                    self.flagged[index] = not unflag
+                    self._update(index)
+                    self._hash ^= self._flag_key(index)
+                    if self.mined[index]:
+                        self.correct_flags += -1 if unflag else 1
+                    else:
+                        self.wrong_flags += -1 if unflag else 1
                     if unflag:
                         self.free_cells += 1
                         if self.flagcount:
@@ -326,6 +935,18 @@ class generic_field():
                         self.free_cells -= 1
                         if self.flagcount:
                             self.flags_left -= 1
+                    if unflag:
+                        self._track_freed([index], False)
+                    else:
+                        self._track_taken([index], False)
+                    if self._undo_log is not None:
+                        self._undo_log.append(('flag', index))
+                    if self._journal is not None:
+                        if unflag:
+                            change = (index, self.S_FLAG, self.S_FREE)
+                        else:
+                            change = (index, self.S_FREE, self.S_FLAG)
+                        self._journal.append(change)
                     self._call('input')
         if not self.free_cells:
             self._call('win')
@@ -335,90 +956,48 @@ class generic_field():
         Unflag the cell at `coordinate` and increment
         `self.flags_left`, unless the cell already is not flagged.
         '''
-        self.flag(coordinate, True)
+        self.flag_i(self.index_of(coordinate), True)
+    
+    def unflag_i(self, index):
+        '''`unflag` for flat indices.'''
+        self.flag_i(index, True)
     
     def get_neighbours(self, coordinate):
         '''
         Return a list of coordinates that are the neighbours to the
         cell at `coordinate`.
+        
+        The list is shared, it MUST NOT be modified.
+        '''
+        index = sum(map(operator.mul, coordinate, self.dimension_multiplier))
+        v = self.topology.lists[index]
+        if v is None:
+            v = self.topology.neighbours(index)
+        return v
+    
+    def neighbours_i(self, index):
+        '''`get_neighbours` for flat indices.'''
+        v = self.topology.index_lists[index]
+        if v is None:
+            v = self.topology.neighbour_indices(index)
+        return v
+    
+    def second_neighbours_i(self, index):
         '''
+        Return a list of the flat indices of the neighbours of the
+        neighbours of the cell at `index`, without the cell itself.
         
-        v = self._get_raw(coordinate)[self.K_CACHE_N]
-        if v is not None: return v
-        
-        # Do some sanity checks on the coordinate.
-        assert len(coordinate) == len(self.dimensions)
-        for index in range(len(coordinate)):
-            assert 0 <= coordinate[index] < self.dimensions[index]
-        
-        # Generate neighbour indices for each axis.
-        axis_neigbours = []
-        for index, position in enumerate(coordinate):
-            # What directions are possible?
-            negative = position > 0
-            positive = position < self.dimensions[index] - 1
-            # What will the relative indices be?
-            if positive and negative:
-                axis_neigbours.append((position - 1, position, position + 1))
-            elif positive:
-                axis_neigbours.append((              position, position + 1))
-            elif negative:
-                axis_neigbours.append((position - 1, position              ))
-            else:
-                axis_neigbours.append((              position              ))
-            
-        # List the neighbours.
-        # neighbours = []
-        if self.moore:
-            # Calculating Moore neighbourhoods requires recursion.
-            def moore(i):
-                out = []
-                for position in axis_neigbours[i]:
-                    if i:
-                        for head in moore(i - 1):
-                            out.append(head + [position])
-                    else:
-                        out.append([position])
-                return out
-            # Filter out the center cell.
-            # Remember that the coordinates are not yet of the proper type.
-            neighbours = list(filter(
-                lambda x: tuple(x) != tuple(coordinate),
-                moore(len(coordinate) - 1)
-            ))
-        else:
-            # von Neumann neighbours only differ on one axis at a time.
-            neighbours = []
-            for axis_index, axis in enumerate(axis_neigbours):
-                for position in axis:
-                    if position != coordinate[axis_index]:
-                        # All other axes are unchanged.
-                        neighbour = []
-                        for i in range(len(coordinate)):
-                            if i == axis_index:
-                                neighbour.append(position)
-                            else:
-                                neighbour.append(coordinate[i])
-                        neighbours.append(neighbour)
-        
-        # Transform the coordinates into a proper form before returning.
-        proper = list(map(tuple, neighbours))
-        self._set_raw(coordinate, self.K_CACHE_N, proper)
-        return proper
+        The list is shared, it MUST NOT be modified.
+        '''
+        v = self.topology.second_lists[index]
+        if v is None:
+            v = self.topology.second_neighbour_indices(index)
+        return v
     
     def all_cells(self):
         '''Return a list of all coordinates.
         '''
-        def list_cells(dimensions):
-            out = []
-            for i in range(dimensions[0]):
-                if len(dimensions) == 1:
-                    out.append([i])
-                else:
-                    for tail in list_cells(dimensions[1:]):
-                        out.append([i] + tail)
-            return out
-        return list(map(tuple, list_cells(self.dimensions)))
+        return list(self.topology.cells)
     
     def reveal(self, coordinate):
         '''"Click" on the free cell at `coordinate`.
@@ -427,131 +1006,776 @@ class generic_field():
         revealed.
         
         It will call the "lose" callback if a mine is revealed.
+        
+        The "input" callback is called exactly once.
+        
+        Returns a list of the coordinates of the newly revealed cells
+        (empty if the cell was already revealed or is flagged).
         '''
-        coordinate_list = [coordinate]
-        lose = False
-        while coordinate_list:
-            coordinate = coordinate_list.pop()
-            cell = self._get_raw(coordinate)
-            if cell[self.K_FLAG]:
-                continue        # Not continuing now would be a terrible idea.
-            if not cell[self.K_VISIBLE]:
-                self._set_raw(coordinate, self.K_VISIBLE, True)
-                self.free_cells -= 1
-                if cell[self.K_MINE]:
-                    lose = True
-                    # break not needed, because only the first revealed
-                    # cell can possibly be a mjne.  There are not other
-                    # coordinates on the list.
-                # Field of zeroes.
-                if cell[self.K_NUMBER] == 0:
-                    coordinate_list.extend(self.get_neighbours(coordinate))
+        revealed = self.reveal_i(self.index_of(coordinate))
+        return list(map(self.topology.cells.__getitem__, revealed))
+    
+    def reveal_i(self, index):
+        '''`reveal` for flat indices.'''
+        return self._reveal([index])
+    
+    def chord(self, coordinate):
+        '''
+        "Click" on all free neighbours of the revealed number at
+        `coordinate` at once, if it has exactly as many flagged
+        neighbours as it says.  Otherwise nothing happens.
+        
+        The callbacks are called once, like in `reveal`.
+        
+        Returns a list of the coordinates of the newly revealed cells.
+        '''
+        revealed = self.chord_i(self.index_of(coordinate))
+        return list(map(self.coordinate_of, revealed))
+    
+    def chord_i(self, index):
+        '''`chord` for flat indices.'''
+        number = self.get_i(index)
+        if number in (None, 'F', 'X'):
+            return []
+        if self.flagged_neighbours_i(index) != number:
+            return []
+        return self._reveal([
+            neighbour for neighbour in self.neighbours_i(index)
+            if self.get_i(neighbour) is None
+        ])
+    
+    def _reveal(self, indices):
+        '''
+        Reveal the free cells at `indices` and the fields of zeroes
+        around them as one change, for `reveal_i` and `chord_i`.
+        '''
+        revealed = []
+        mines = []
+        for index in indices:
+            # Skip the ones revealed by the floods of the others.
+            if self.flagged[index] or self.visible[index]:
+                continue
+            if self.mined[index]:
+                mines.append(index)
+            if self.accelerated and self.numbers[index] == 0:
+                revealed.extend(self._flood_numpy(index))
+            else:
+                revealed.extend(self._flood(index))
+        if revealed:
+            self._track_taken(revealed, True)
+        if self._undo_log is not None and revealed:
+            self._undo_log.append(('reveal', revealed))
+        self.free_cells -= len(revealed)
+        # Only the cells at `indices` can possibly be mines.
+        lose = bool(mines)
+        for index in mines:
+            self.state[index] = self.S_MINE
+        if revealed:
+            # They were all free, which doesn't count.
+            self._hash ^= self._hash_cells(revealed)
+        if self._journal is not None:
+            S_FREE = self.S_FREE
+            state = self.state
+            self._journal.extend([
+                (index, S_FREE, state[index]) for index in revealed
+            ])
         # Final callbacks
         self._call('input')
         if lose:
             self._call('lose')
         elif not self.free_cells:
             self._call('win')
+        return revealed
     
-    def fill(self, mines):
-        '''Fill the field with mines and generate the numbers.
+    def _flood(self, index):
+        '''
+        Reveal the free cell at `index` and the field of zeroes around
+        it; return a list of the flat indices of the revealed cells.
         
-        `mines` is a list of coordinates of the mines.
+        Cells are marked visible as soon as they are queued, so no
+        cell is ever looked at twice.  `self.free_cells`, the mine and
+        the callbacks are left to `_reveal`.
         '''
-        # Sanity checking.
-        for index, mine in enumerate(mines):
-            for another_index, another_mine in enumerate(mines):
-                if another_index != index:
-                    assert another_mine != mine
-        # Place the mines.
-        if self.flagcount:
-            self.flags_left = len(mines)
-        for mine in mines:
-            self._set_raw(mine, self.K_MINE, True)
-        # Generate the numbers.
-        for coordinate in self.all_cells():
-            count = 0
-            for neighbour in self.get_neighbours(coordinate):
-                 if self._get_raw(neighbour)[self.K_MINE]:
-                     count += 1
-            self._set_raw(coordinate, self.K_NUMBER, count)
+        offsets = self.topology.offsets
+        targets = self.topology.targets
+        visible = self.visible
+        flagged = self.flagged
+        numbers = self.numbers
+        state = self.state
+        visible[index] = 1
+        # The list of revealed cells doubles as the queue.
+        revealed = [index]
+        i = 0
+        while i < len(revealed):
+            index = revealed[i]
+            i += 1
+            state[index] = numbers[index]
+            # Field of zeroes.
+            if numbers[index] == 0:
+                for neighbour in targets[offsets[index]:offsets[index+1]]:
+                    if not visible[neighbour] and not flagged[neighbour]:
+                        visible[neighbour] = 1
+                        revealed.append(neighbour)
+        return revealed
     
-    def __str__(self):
-        '''Generate a simple text version of a two dimensional field for
-        debugging purposes.
+    def _flood_numpy(self, index):
         '''
-        if len(self.dimensions) != 2:
-            return "<String representation is only available in 2D fields.>\n"
-        
-        trans = {
-            None: ' ',  'F': 'F',       'X': 'X',       0: '-',
-            1: '1',     2: '2',         3: '3',         4: '4',
-            5: '5',     6: '6',         7: '7',         8: '8'
-        }
-        
-        pre_post = '#' * (self.dimensions[0] + 2) + '\n'
-        
-        out = pre_post
-        for y in range(self.dimensions[1]):
-            out += '#'
-            for x in range(self.dimensions[0]):
-                out += trans[self.get((x, y))]
-            out += '#\n'
-        out += pre_post
-        out += 'Flags left: {0}\n'.format(self.flags_left)
+        The NumPy version of `_flood` for a free zero at `index`.
         
-        return out
-
-
-class hexagonal_field(generic_field):
-    r'''
-    Coordinate system
-    =================
+        The zero region is grown one layer at a time with a mask of
+        the cells that have already been reached.
+        '''
+        numbers = numpy.frombuffer(self.numbers, dtype=self.typecode)
+        # Cells that can't be revealed count as already reached.
+        reached = numpy.frombuffer(self.visible, dtype=numpy.uint8) != 0
+        reached |= numpy.frombuffer(self.flagged, dtype=numpy.uint8) != 0
+        reached[index] = True
+        region = [numpy.array([index], dtype=numpy.intp)]
+        zeroes = region[0]
+        while len(zeroes):
+            layer = self.topology.gather(zeroes)
+            layer = numpy.unique(layer[~reached[layer]])
+            reached[layer] = True
+            region.append(layer)
+            zeroes = layer[numbers[layer] == 0]
+        region = numpy.concatenate(region)
+        numpy.frombuffer(self.visible, dtype=numpy.uint8)[region] = 1
+        state = numpy.frombuffer(self.state, dtype=self.typecode)
+        state[region] = numbers[region]
+        return region.tolist()
     
-        Each coordinate is a tuple of (x, y).
-        Where x and y are integers and
-            0 <= x < width
-            0 <= y < height
+    def frontier(self):
+        '''Return a list of the revealed cells that have free neighbours.
+        '''
+        return list(map(self.coordinate_of, sorted(self.frontier_i())))
+    
+    def frontier_i(self):
+        '''`frontier` for flat indices.  Returns the shared set.'''
+        return self._frontier
+    
+    def deserted(self):
+        '''
+        Return a list of the free cells that are not neighbours of any
+        revealed cell.
+        '''
+        return list(map(self.coordinate_of, sorted(self.deserted_i())))
+    
+    def deserted_i(self):
+        '''`deserted` for flat indices.  Returns the shared set.'''
+        if self._deserted is None:
+            seen = bytearray(self.visible)
+            for index in self._frontier:
+                for neighbour in self.neighbours_i(index):
+                    seen[neighbour] = 1
+            self._deserted = set([
+                index for index in range(self.n_cells)
+                if not seen[index] and not self.flagged[index]
+            ])
+        return self._deserted
+    
+    def flagged_neighbours_i(self, index):
+        '''The number of flagged neighbours of the cell at `index`.'''
+        return self._flagged_neighbours[index]
+    
+    def free_neighbours_i(self, index):
+        '''The number of free neighbours of the cell at `index`.'''
+        return self._free_neighbours[index]
+    
+    def conflict_i(self, index):
+        '''
+        True if the cell at `index` is a number with more flags around
+        it than it says, or with too few free neighbours left for the
+        rest of its mines.
+        '''
+        number = self.get_i(index)
+        if number in (None, 'F', 'X'):
+            return False
+        flags = self.flagged_neighbours_i(index)
+        return flags > number or self.free_neighbours_i(index) < number - flags
+    
+    def incoming_i(self, index):
+        '''
+        Return a list of the flat indices of the cells that have the
+        cell at `index` as a neighbour.  The same cells as
+        `neighbours_i` unless it's a `graph_field`.
         
-        What makes this different from square fields is that odd lines
-        are indented (a half step) on the screen so that it looks like.
+        The list is shared, it MUST NOT be modified.
+        '''
+        return self.topology.incoming().neighbour_indices(index)
+    
+    def state_hash(self, cells=None):
+        '''
+        Return a 64 bit Zobrist hash of the states (see `get`) of all
+        cells, or of the cells in the list `cells`.
         
-         / \ / \ / \ / \ / \ / \ / \
-        |0,0|1,0|2,0|3,0|4,0|5,0|6,0|
-         \ / \ / \ / \ / \ / \ / \ / \
-          |0,1|1,1|2,1|3,1|4,1|5,1|6,1|
-         / \ / \ / \ / \ / \ / \ / \ /
-        |0,2|1,2|2,2|3,2|4,2|5,2|6,2|
-         \ / \ / \ / \ / \ / \ / \ / \
-          |0,3|1,3|2,3|3,3|4,3|5,3|6,3|
-           \ / \ / \ / \ / \ / \ / \ /
+        The hash of the whole field is kept up to date by every
+        change, so it's O(1).  The hash of `cells` is O(len(cells)).
         
-        The neighbourhoods are similar to Moore neighbourhoods, but
-        these have no "corners" on the right for even rows, and no
-        "corners" on the left on odd rows
+        Free cells don't count, so the hash of a list of cells only
+        depends on its cells that aren't free.  The order of the cells
+        doesn't matter.
         
-        The hexagonal neighbours are:
-            (x - 1 + y%2,  y - 1)       (x + y%2,  y - 1)
-            (x - 1,  y)                 (x + 1,  y)
-            (x - 1 + y%2,  y + 1)       (x + y%2,  y + 1)
+        The hashes are the same in every process for fields with the
+        same geometry.
+        '''
+        if cells is None:
+            return self._hash
+        return self._hash_cells(self._indices_of(cells))
     
+    def state_hash_i(self, indices=None):
+        '''`state_hash` for flat indices.'''
+        if indices is None:
+            return self._hash
+        return self._hash_cells(indices)
     
-    See the doc-string for `generic_field` for everything else.
-    Notice that `__init__` accepts different arguments.
-        __init__(self, width, height, flagcount=True)
-    '''
-    def __init__(self, width, height, flagcount=True):
-        self.flagcount = flagcount
-        self.dimensions = [width, height]
+    def layout_hash(self):
+        '''
+        Return a 64 bit Zobrist hash of the positions of the mines, to
+        find duplicates among generated fields.
+        '''
+        return self._layout_hash
+    
+    def _hash_cells(self, indices):
+        '''
+        XOR of the Zobrist keys of the cells at `indices` in their
+        current states, see `_topology.zobrist`.
+        '''
+        if self.accelerated and len(indices) >= _numpy_threshold:
+            keys, multipliers = self.topology.zobrist_arrays()
+            indices = numpy.asarray(indices, dtype=numpy.intp)
+            state = numpy.frombuffer(self.state, dtype=self.typecode)
+            return int(numpy.bitwise_xor.reduce(
+                keys[indices] * multipliers[state[indices]]
+            ))
+        keys, multipliers = self.topology.zobrist()
+        state = self.state
+        h = 0
+        for index in indices:
+            h ^= keys[index] * multipliers[state[index]]
+        return h & _zobrist_mask
+    
+    def _flag_key(self, index):
+        '''
+        The Zobrist key of a flag at `index`, the hash changes by this
+        when the cell is flagged or unflagged.
+        '''
+        keys, multipliers = self.topology.zobrist()
+        return keys[index] * multipliers[self.S_FLAG] & _zobrist_mask
+    
+    def _track_taken(self, indices, revealed):
+        '''
+        Update the frontier for the cells at `indices` that have just
+        been flagged, or revealed if `revealed` is True.
+        '''
+        if self.accelerated and len(indices) >= _numpy_threshold:
+            self._track_taken_numpy(indices, revealed)
+            return
+        free = self._free_neighbours
+        frontier = self._frontier
+        incoming = self.topology.incoming().neighbour_indices
+        for index in indices:
+            for cell in incoming(index):
+                count = free[cell] - 1
+                free[cell] = count
+                if not count:
+                    frontier.discard(cell)
+        if not revealed:
+            flagged = self._flagged_neighbours
+            for index in indices:
+                for cell in incoming(index):
+                    flagged[cell] += 1
+        deserted = self._deserted
+        if deserted is not None:
+            deserted.difference_update(indices)
+        if revealed:
+            for index in indices:
+                if free[index]:
+                    frontier.add(index)
+                if deserted is not None:
+                    deserted.difference_update(self.neighbours_i(index))
+    
+    def _track_taken_numpy(self, indices, revealed):
+        '''The NumPy version of `_track_taken`.'''
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        free = numpy.frombuffer(self._free_neighbours, dtype=self.typecode)
+        cells, counts = numpy.unique(
+            self.topology.incoming().gather(indices), return_counts=True
+        )
+        free[cells] -= counts.astype(free.dtype)
+        self._frontier.difference_update(cells[free[cells] == 0].tolist())
+        if not revealed:
+            flagged = numpy.frombuffer(
+                self._flagged_neighbours, dtype=self.typecode
+            )
+            flagged[cells] += counts.astype(flagged.dtype)
+        deserted = self._deserted
+        if deserted is not None:
+            deserted.difference_update(indices.tolist())
+        if revealed:
+            self._frontier.update(indices[free[indices] != 0].tolist())
+            if deserted is not None:
+                deserted.difference_update(
+                    self.topology.gather(indices).tolist()
+                )
+    
+    def _track_freed(self, indices, revealed):
+        '''
+        Update the frontier for the cells at `indices` that have just
+        been unflagged, or hidden again if `revealed` is True.
+        '''
+        free = self._free_neighbours
+        flagged = self._flagged_neighbours
+        frontier = self._frontier
+        visible = self.visible
+        incoming = self.topology.incoming().neighbour_indices
+        for index in indices:
+            if revealed:
+                frontier.discard(index)
+            for cell in incoming(index):
+                free[cell] += 1
+                if free[cell] == 1 and visible[cell]:
+                    frontier.add(cell)
+                if not revealed:
+                    flagged[cell] -= 1
+        if revealed:
+            # The cells around them may be deserted again.
+            self._deserted = None
+        elif self._deserted is not None:
+            for index in indices:
+                for cell in incoming(index):
+                    if visible[cell]:
+                        break
+                else:
+                    self._deserted.add(index)
+    
+    def _journal_reset(self):
+        '''Journal that every cell is about to become free.'''
+        S_FREE = self.S_FREE
+        self._journal.extend([
+            (index, code, S_FREE)
+            for index, code in enumerate(self.state)
+            if code != S_FREE
+        ])
+    
+    def set_journal(self, enabled):
+        '''
+        Start (`enabled` is True) or stop keeping a journal of the
+        cells that change, see `drain_changes`.
+        
+        The journal is off by default.
+        '''
+        if not enabled:
+            self._journal = None
+        elif self._journal is None:
+            self._journal = []
+    
+    def drain_changes(self):
+        '''
+        Return and forget the changes in the journal.
+        
+        Returns a list of (index, old, new) tuples in the order the
+        changes were made, where `index` is the flat index of the cell
+        and `old` and `new` are values as returned by `get`.  The same
+        cell may be listed more than once.
+        
+        Returns an empty list if the journal is off.
+        '''
+        if self._journal is None:
+            return []
+        decode = self.decode
+        changes = [
+            (index, decode[old], decode[new])
+            for index, old, new in self._journal
+        ]
+        del self._journal[:]
+        return changes
+    
+    def snapshot(self):
+        '''
+        Checkpoint the visible and flagged cells; returns a token for
+        `restore` or `discard`.
+        
+        This is cheap: while there are snapshots, `flag`, `unflag` and
+        `reveal` keep an undo log, so taking a snapshot is O(1) and
+        restoring it is O(cells changed since).
+        
+        Snapshots nest: restoring or discarding a snapshot also
+        invalidates the ones taken after it.  `clear` and `fill`
+        invalidate all of them.
+        '''
+        if self._undo_log is None:
+            self._undo_log = []
+        token = (
+            len(self._undo_log),
+            self.free_cells, self.flags_left,
+            self.correct_flags, self.wrong_flags,
+        )
+        self._snapshots.append(token)
+        return token
+    
+    def _pop_snapshots(self, token):
+        '''Remove `token` and all later snapshots from the stack.'''
+        for position in range(len(self._snapshots) - 1, -1, -1):
+            if self._snapshots[position] is token:
+                del self._snapshots[position:]
+                return
+        raise ValueError('Invalid or expired snapshot token')
+    
+    def restore(self, token):
+        '''
+        Undo all flags, unflags and reveals since `snapshot` returned
+        `token`.  The token is used up.
+        
+        Callbacks are not called.
+        '''
+        self._pop_snapshots(token)
+        length = token[0]
+        log = self._undo_log
+        journal = self._journal
+        while len(log) > length:
+            action, what = log.pop()
+            if action == 'flag':
+                old = self.state[what]
+                self.flagged[what] = not self.flagged[what]
+                self._update(what)
+                self._hash ^= self._flag_key(what)
+                if self.flagged[what]:
+                    self._track_taken([what], False)
+                else:
+                    self._track_freed([what], False)
+                if journal is not None:
+                    journal.append((what, old, self.state[what]))
+            else:
+                self._hash ^= self._hash_cells(what)
+                for index in what:
+                    if journal is not None:
+                        journal.append((index, self.state[index], self.S_FREE))
+                    self.visible[index] = 0
+                    self.state[index] = self.S_FREE
+                self._track_freed(what, True)
+        (
+            self.free_cells, self.flags_left,
+            self.correct_flags, self.wrong_flags
+        ) = token[1:]
+        if not self._snapshots:
+            self._undo_log = None
+    
+    def discard(self, token):
+        '''Forget the snapshot `token` without restoring it.'''
+        self._pop_snapshots(token)
+        if not self._snapshots:
+            self._undo_log = None
+    
+    def fill(self, mines):
+        '''Fill the field with mines and generate the numbers.
+        
+        `mines` is a list of coordinates of the mines.
+        
+        Invalidates all snapshots.
+        '''
+        self.fill_i(self._indices_of(mines))
+    
+    def _indices_of(self, coordinates):
+        '''
+        `index_of` for a list of coordinates.  Returns a list, or a
+        NumPy array if the field is accelerated.
+        '''
+        if self.accelerated and len(coordinates):
+            return numpy.dot(
+                numpy.array(coordinates, dtype=numpy.intp),
+                numpy.array(self.dimension_multiplier, dtype=numpy.intp)
+            )
+        return list(map(self.index_of, coordinates))
+    
+    def fill_i(self, indices):
+        '''`fill` for flat indices.  `indices` may be a NumPy array.'''
+        self._undo_log = None
+        self._snapshots = []
+        self.n_mines = len(indices)
+        if self.flagcount:
+            self.flags_left = len(indices)
+        if self.accelerated:
+            indices = numpy.asarray(indices, dtype=numpy.intp)
+            self._mine_indices = indices.tolist()
+            self._fill_numpy(indices)
+            keys = self.topology.zobrist_arrays()[0]
+            self._layout_hash = int(numpy.bitwise_xor.reduce(keys[indices]))
+            return
+        self._mine_indices = list(indices)
+        self._place_mines(self._mine_indices)
+        keys = self.topology.zobrist()[0]
+        layout_hash = 0
+        for index in self._mine_indices:
+            layout_hash ^= keys[index]
+        self._layout_hash = layout_hash
+    
+    def _place_mines(self, indices):
+        '''
+        Set `self.mined` and generate the numbers for the list
+        `indices` of flat indices.  The arrays MUST be clear.
+        '''
+        # Sanity checking.
+        assert len(set(indices)) == len(indices)
+        # Place the mines.
+        for index in indices:
+            self.mined[index] = 1
+        # Generate the numbers: every mine adds one to the cells that
+        # have it as a neighbour (its neighbours, unless the field is a
+        # `graph_field` with one-way neighbourhoods).
+        numbers = self.numbers
+        incoming = self.topology.incoming()
+        offsets = incoming.offsets
+        targets = incoming.targets
+        for index in indices:
+            for neighbour in targets[offsets[index]:offsets[index+1]]:
+                numbers[neighbour] += 1
+    
+    def _fill_numpy(self, indices):
+        '''The NumPy version of `fill_i`.'''
+        # Sanity checking.
+        assert len(numpy.unique(indices)) == len(indices)
+        # Place the mines.
+        mined = numpy.frombuffer(self.mined, dtype=numpy.uint8)
+        mined[indices] = 1
+        # Generate the numbers: count how many times each cell has a
+        # mine as a neighbour.
+        numpy.frombuffer(self.numbers, dtype=self.typecode)[:] = (
+            numpy.bincount(
+                self.topology.incoming().gather(indices),
+                minlength=self.n_cells
+            )
+        )
+    
+    def reseed(self, mines, startpoint):
+        '''
+        Replace the mines with `mines` (a list of coordinates), reset
+        every cell to free and reveal `startpoint`.
+        
+        Same as `clear`, `fill(mines)` and `reveal(startpoint)` but much
+        cheaper when trying one set of mines after another:  The arrays
+        are reused, and if only a few mines moved only the numbers
+        around them are updated.
+        '''
+        self.reseed_i(self._indices_of(mines), self.index_of(startpoint))
+    
+    def reseed_i(self, indices, start):
+        '''`reseed` for flat indices.  `indices` may be a NumPy array.'''
+        if self.accelerated:
+            removed = added = None
+        else:
+            old = set(self._mine_indices)
+            new = set(indices)
+            # Sanity checking.
+            assert len(new) == len(indices)
+            removed = old - new
+            added = new - old
+        if removed is not None and len(removed) + len(added) < len(new):
+            # Only update the numbers around the mines that moved.
+            mined = self.mined
+            numbers = self.numbers
+            incoming = self.topology.incoming()
+            offsets = incoming.offsets
+            targets = incoming.targets
+            for index in removed:
+                mined[index] = 0
+                for neighbour in targets[offsets[index]:offsets[index+1]]:
+                    numbers[neighbour] -= 1
+            for index in added:
+                mined[index] = 1
+                for neighbour in targets[offsets[index]:offsets[index+1]]:
+                    numbers[neighbour] += 1
+            keys = self.topology.zobrist()[0]
+            for index in removed | added:
+                self._layout_hash ^= keys[index]
+            self._mine_indices = list(indices)
+        else:
+            # Cheaper to start over, but still in place.
+            self.mined[:] = self.topology.blank_bits
+            self.numbers[:] = self._blank_numbers
+            self.fill_i(indices)
+        # Reset the cells in place.
+        if self._journal is not None:
+            self._journal_reset()
+        self.visible[:] = self.topology.blank_bits
+        self.flagged[:] = self.topology.blank_bits
+        self.state[:] = self._blank_state
+        self._free_neighbours[:] = self._blank_free
+        self._flagged_neighbours[:] = self._blank_numbers
+        self._frontier.clear()
+        self._deserted = None
+        self._hash = 0
+        self.free_cells = self.n_cells
+        self.n_mines = len(indices)
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        self._undo_log = None
+        self._snapshots = []
+        if self.flagcount:
+            self.flags_left = len(indices)
+        self.reveal_i(start)
+    
+    def _geometry(self):
+        '''Return the kind (see `dumps`) and dimensions of the field.'''
+        return {True: b'M', False: b'N'}[bool(self.moore)], self.dimensions
+    
+    def dumps(self):
+        '''
+        Return the field (mines, flags and revealed cells) as a string
+        of bytes that `loads` can read.
+        
+        Format version 1, all integers are big endian:
+            4 bytes     b'AMFD'
+            uint8       Version (1)
+            1 byte      b'M' (Moore), b'N' (von Neumann) or b'H'
+                        (hexagonal).
+            uint8       Options: 1 = flagcount, 2 = torus
+            uint8       Number of dimensions
+            uint32      Dimensions...
+            bitset      Mined cells
+            bitset      Flagged cells
+            bitset      Revealed cells
+        
+        A bitset has one bit per cell in flat index order, the first
+        cell in the most significant bit of the first byte, padded to
+        a whole byte.
+        '''
+        return b''.join([
+            self._header(_SAVE_MAGIC),
+            _pack_bits(self.mined),
+            _pack_bits(self.flagged),
+            _pack_bits(self.visible),
+        ])
+    
+    def _header(self, magic):
+        '''The header of `dumps` (or `share`) with `magic` first.'''
+        kind, dimensions = self._geometry()
+        options = 0
+        if self.flagcount:
+            options |= _SAVE_FLAGCOUNT
+        if self.torus:
+            options |= _SAVE_TORUS
+        return magic + struct.pack(
+            '>BcBB{0}I'.format(len(dimensions)),
+            _SAVE_VERSION, kind, options, len(dimensions), *dimensions
+        )
+    
+    def save(self, filename):
+        '''Write `self.dumps()` to the file `filename`.'''
+        f = open(filename, 'wb')
+        try:
+            f.write(self.dumps())
+        finally:
+            f.close()
+    
+    def share(self):
+        '''
+        Copy the field into a new `multiprocessing.shared_memory` block
+        that other processes can `attach` to, see `field_image`.
+        '''
+        if shared_memory is None:
+            raise NotImplementedError('Shared memory requires Python 3.8')
+        return field_image(self)
+    
+    def _load_bits(self, mined, flagged, visible):
+        '''
+        Set up a cleared field from the arrays from a save file, see
+        `loads`.  No cell may be both flagged and visible.
+        '''
+        cells = range(self.n_cells)
+        self.fill_i(list(itertools.compress(cells, mined)))
+        self.flagged = flagged
+        self.visible = visible
+        for index in itertools.compress(cells, flagged):
+            self.state[index] = self.S_FLAG
+            if mined[index]:
+                self.correct_flags += 1
+            else:
+                self.wrong_flags += 1
+        for index in itertools.compress(cells, visible):
+            self._update(index)
+        self._track_taken(list(itertools.compress(cells, flagged)), False)
+        self._track_taken(list(itertools.compress(cells, visible)), True)
+        self._hash = self._hash_cells(
+            list(itertools.compress(cells, flagged)) +
+            list(itertools.compress(cells, visible))
+        )
+        n_flags = self.correct_flags + self.wrong_flags
+        self.free_cells = self.n_cells - n_flags - visible.count(b'\x01')
+        if self.flagcount:
+            self.flags_left = self.n_mines - n_flags
+    
+    def __str__(self):
+        '''Generate a simple text version of a two dimensional field for
+        debugging purposes.
+        '''
+        if len(self.dimensions) != 2:
+            return "<String representation is only available in 2D fields.>\n"
+        
+        trans = {
+            None: ' ',  'F': 'F',       'X': 'X',       0: '-',
+            1: '1',     2: '2',         3: '3',         4: '4',
+            5: '5',     6: '6',         7: '7',         8: '8'
+        }
+        
+        pre_post = '#' * (self.dimensions[0] + 2) + '\n'
+        
+        out = pre_post
+        for y in range(self.dimensions[1]):
+            out += '#'
+            for x in range(self.dimensions[0]):
+                out += trans[self.get((x, y))]
+            out += '#\n'
+        out += pre_post
+        out += 'Flags left: {0}\n'.format(self.flags_left)
+        
+        return out
+
+
+class hexagonal_field(generic_field):
+    r'''
+    Coordinate system
+    =================
+    
+        Each coordinate is a tuple of (x, y).
+        Where x and y are integers and
+            0 <= x < width
+            0 <= y < height
+        
+        What makes this different from square fields is that odd lines
+        are indented (a half step) on the screen so that it looks like.
+        
+         / \ / \ / \ / \ / \ / \ / \
+        |0,0|1,0|2,0|3,0|4,0|5,0|6,0|
+         \ / \ / \ / \ / \ / \ / \ / \
+          |0,1|1,1|2,1|3,1|4,1|5,1|6,1|
+         / \ / \ / \ / \ / \ / \ / \ /
+        |0,2|1,2|2,2|3,2|4,2|5,2|6,2|
+         \ / \ / \ / \ / \ / \ / \ / \
+          |0,3|1,3|2,3|3,3|4,3|5,3|6,3|
+           \ / \ / \ / \ / \ / \ / \ /
+        
+        The neighbourhoods are similar to Moore neighbourhoods, but
+        these have no "corners" on the right for even rows, and no
+        "corners" on the left on odd rows
         
-        self.K_VISIBLE = 0
-        self.K_FLAG = 1
-        self.K_MINE = 2
-        self.K_NUMBER = 3
-        self.K_CACHE_N = 4
-        self.K_VALUE = 5
+        The hexagonal neighbours are:
+            (x - 1 + y%2,  y - 1)       (x + y%2,  y - 1)
+            (x - 1,  y)                 (x + 1,  y)
+            (x - 1 + y%2,  y + 1)       (x + y%2,  y + 1)
+    
+    
+    See the doc-string for `generic_field` for everything else.
+    Notice that `__init__` accepts different arguments.
+        __init__(self, width, height, flagcount=True, torus=False)
         
-        # self.cache_N = cache_N
+        `height` MUST be even if `torus` is True, or the odd rows
+        wouldn't line up across the edge.
+    '''
+    def __init__(self, width, height, flagcount=True, torus=False):
+        assert not torus or height % 2 == 0, 'Odd height on a torus'
+        self.flagcount = flagcount
+        self.torus = torus
+        self.dimensions = [width, height]
         
         self.callbacks = {
             'input': (None, None),
@@ -562,35 +1786,14 @@ class hexagonal_field(generic_field):
         self.N_DIMENSIONS = 2
         self.dimension_multiplier = [height, 1]
         
-        self.clear()
-    
-    def get_neighbours(self, coordinate):
-        v = self._get_raw(coordinate)[self.K_CACHE_N]
-        if v is not None: return v
-        
-        x, y = coordinate
-        if y % 2:
-            neighbours = [
-                    (x, y-1), (x+1, y-1),
-                (x-1, y),               (x+1, y),
-                    (x, y+1), (x+1, y+1)
-            ]
-        else:
-            neighbours = [
-                    (x-1, y-1), (x, y-1),
-                (x-1, y),               (x+1, y),
-                    (x-1, y+1), (x, y+1)
-            ]
-        v = list(filter(
-            lambda coord: 0 <= coord[0] < self.dimensions[0],
-            list(filter(
-                lambda coord: 0 <= coord[1] < self.dimensions[1],
-                neighbours
-            ))
-        ))
-        self._set_raw(coordinate, self.K_CACHE_N, v)
-        return v
+        self.topology = _shared_topology(
+            ('hex', width, height, bool(torus)),
+            lambda: _hexagonal_topology(width, height, torus)
+        )
+        self._init_storage()
     
+    def _geometry(self):
+        return b'H', self.dimensions
     
     def __str__(self):
         trans = {
@@ -616,10 +1819,1393 @@ class hexagonal_field(generic_field):
         return out
 
 
+class graph_field(generic_field):
+    '''
+    A field of any shape, built from an adjacency list.
+    
+        __init__(self, adjacency, flagcount=True)
+            `adjacency` is a list of (cell, neighbours) pairs, or a
+            dictionary that maps each cell to its neighbours.
+            `neighbours` is a list of cells.
+            
+            The cells (coordinates) can be anything hashable.  They
+            get flat indices in the order they are listed; the keys of
+            a dictionary are sorted first, so they MUST be sortable.
+            
+            A cell MUST NOT be its own neighbour or list the same
+            neighbour twice, and every neighbour MUST be a cell.
+            Neighbourhoods don't need to be symmetrical.
+    
+    The adjacency is compiled into the same kind of flat tables as the
+    built-in geometries at construction, so the field is as fast as
+    `generic_field`.  Graph fields can't be saved with `dumps`.
+    
+    See the doc-string for `generic_field` for everything else.
+    '''
+    def __init__(self, adjacency, flagcount=True):
+        if isinstance(adjacency, dict):
+            adjacency = [
+                (cell, adjacency[cell]) for cell in sorted(adjacency)
+            ]
+        cells = [cell for cell, neighbours in adjacency]
+        self._index = {}
+        for index, cell in enumerate(cells):
+            assert cell not in self._index, 'Duplicate cell'
+            self._index[cell] = index
+        rows = []
+        for index, (cell, neighbours) in enumerate(adjacency):
+            row = [self._index[neighbour] for neighbour in neighbours]
+            assert index not in row, 'A cell can not neighbour itself'
+            assert len(set(row)) == len(row), 'Duplicate neighbour'
+            rows.append(row)
+        
+        self.flagcount = flagcount
+        self.dimensions = [len(cells)]
+        self.callbacks = {
+            'input': (None, None),
+            'lose': (None, None),
+            'win': (None, None),
+        }
+        self.N_DIMENSIONS = 1
+        self.dimension_multiplier = [1]
+        self.topology = _topology(cells, rows)
+        self._init_storage()
+    
+    def index_of(self, coordinate):
+        return self._index[coordinate]
+    
+    def _indices_of(self, coordinates):
+        return list(map(self._index.__getitem__, coordinates))
+    
+    def get(self, coordinate):
+        return self.decode[self.state[self._index[coordinate]]]
+    
+    def get_neighbours(self, coordinate):
+        index = self._index[coordinate]
+        v = self.topology.lists[index]
+        if v is None:
+            v = self.topology.neighbours(index)
+        return v
+    
+    def _geometry(self):
+        raise NotImplementedError('Graph fields can not be saved')
+
+
+class bitboard_field(generic_field):
+    '''
+    A two dimensional `generic_field` that also works with the field
+    as Python integers used as bitboards, where bit number
+    `self.bit_of(index)` represents the cell with the flat index
+    `index`.
+    
+    `fill` and the zero region flood fill of `reveal` are computed with
+    shifts and masks over the whole board instead of cell by cell.  The
+    arrays of `generic_field` are still what the field really is, so
+    everything else works as usual.
+    
+        __init__(self, dimensions, moore=True, flagcount=True)
+            Same as `generic_field`, but `dimensions` MUST be two
+            dimensional.
+    
+    
+    Masks
+    =====
+    
+        to_bits(self, cells)
+            Convert a bytearray of zeroes and ones indexed by flat
+            index, such as `self.visible`, `self.flagged` or
+            `self.mined`, into a bitboard.
+        
+        from_bits(self, bits)
+            Return a list of the flat indices of the cells in `bits`.
+        
+        bit_of(self, index)
+            The bit of the cell with the flat index `index`.
+        
+        dilate(self, bits)
+            `bits` and all their neighbours.
+        
+        self.board
+            The bitboard with every cell.
+    
+    
+    Layout
+    ======
+    
+        The cells are stored column by column (the flat index order)
+        with a guard bit after each column:
+        
+            bit = index + index // height
+        
+        Shifting by one moves a cell up or down, shifting by
+        height + 1 moves it sideways, and the guard bits stop
+        anything from leaking between columns.
+    '''
+    def __init__(self, dimensions, moore=True, flagcount=True):
+        assert len(dimensions) == 2
+        generic_field.__init__(self, dimensions, moore, flagcount)
+        # The arrays are handled with bitboards, not NumPy.
+        self.accelerated = False
+        width, height = dimensions
+        self._column = height + 1
+        self._n_bits = width * self._column
+        self.board = 0
+        for x in range(width):
+            self.board |= ((1 << height) - 1) << (x * self._column)
+        # Bit number -> flat index, for `from_bits`; guards are None.
+        self._bit_index = []
+        for x in range(width):
+            self._bit_index.extend(range(x*height, (x+1)*height))
+            self._bit_index.append(None)
+        # Neighbours as bit shifts.
+        if moore:
+            self._shifts = [
+                dx * self._column + dy
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                if dx or dy
+            ]
+        else:
+            self._shifts = [-self._column, -1, 1, self._column]
+    
+    def bit_of(self, index):
+        return index + index // self.dimensions[1]
+    
+    def to_bits(self, cells):
+        height = self.dimensions[1]
+        digits = cells.translate(_bits_to_digits)
+        digits = b'0'.join([
+            bytes(digits[start:start + height])
+            for start in range(0, len(digits), height)
+        ])
+        return int(digits[::-1] or b'0', 2)
+    
+    def from_bits(self, bits):
+        digits = '{0:0{1}b}'.format(bits & self.board, self._n_bits)
+        digits = bytearray(digits[::-1].encode('ascii'))
+        return list(itertools.compress(
+            self._bit_index, digits.translate(_digits_to_bits)
+        ))
+    
+    def dilate(self, bits):
+        if self.moore:
+            # Separable:  up and down first, then sideways.
+            bits |= (bits << 1) | (bits >> 1)
+            bits |= (bits << self._column) | (bits >> self._column)
+        else:
+            bits = (
+                bits |
+                (bits << 1) | (bits >> 1) |
+                (bits << self._column) | (bits >> self._column)
+            )
+        return bits & self.board
+    
+    def _place_mines(self, indices):
+        '''
+        `generic_field._place_mines` with the numbers computed all at
+        once:  The binary digits of the bitboard of mines are read as
+        hexadecimal digits, giving four bits per cell, and then the
+        shifted copies are summed without any carries between cells.
+        '''
+        # Sanity checking.
+        assert len(set(indices)) == len(indices)
+        for index in indices:
+            self.mined[index] = 1
+        mines = self.to_bits(self.mined)
+        if not mines:
+            return
+        nibbles = int('{0:b}'.format(mines), 16)
+        total = 0
+        for shift in self._shifts:
+            if shift > 0:
+                total += nibbles << (4 * shift)
+            else:
+                total += nibbles >> (-4 * shift)
+        # Back to one byte per cell, without the guards.
+        digits = '{0:0{1}x}'.format(total, self._n_bits)
+        digits = bytearray(digits[-self._n_bits:][::-1].encode('ascii'))
+        digits = digits.translate(_hex_digits_to_bytes)
+        height = self.dimensions[1]
+        self.numbers[:] = array.array(self.typecode, bytes(b''.join([
+            bytes(digits[start:start + height])
+            for start in range(0, self._n_bits, self._column)
+        ])))
+    
+    def _flood(self, index):
+        '''`generic_field._flood` with bitboards for zero regions.'''
+        if self.numbers[index]:
+            return generic_field._flood(self, index)
+        numbers = self.numbers
+        state = self.state
+        visible = self.visible
+        allowed = self.board & ~(
+            self.to_bits(self.visible) | self.to_bits(self.flagged)
+        )
+        zeroes = self.to_bits(
+            bytearray(_array_bytes(numbers)).translate(_zero_to_digit_bits)
+        )
+        region = grow = 1 << self.bit_of(index)
+        while grow:
+            new = self.dilate(grow) & allowed & ~region
+            region |= new
+            grow = new & zeroes
+        revealed = self.from_bits(region)
+        for index in revealed:
+            visible[index] = 1
+            state[index] = numbers[index]
+        return revealed
+
+
+class sparse_field(generic_field):
+    '''
+    A `generic_field` for huge fields with few mines, that only stores
+    what has happened rather than every cell.
+    
+        __init__(self, dimensions, moore=True, flagcount=True)
+            Same as `generic_field`.
+    
+    Memory grows with the explored area instead of the size of the
+    field:
+        * the mines and flags are sets of flat indices,
+        * the numbers are computed when they are revealed,
+        * revealed zeroes are stored as runs of flat indices, and
+        * the neighbourhoods are computed when they are first needed.
+    
+    `clear` is cheap, but `all_cells` still lists every cell.
+    
+    The snapshots, the journal, the hashes, `export_state` and saving
+    are not supported.
+    
+    See the doc-string for `generic_field` for everything else.
+    
+    
+    Internal
+    ========
+    
+        self.mined
+        self.flagged
+            Sets of flat indices.
+        
+        self._revealed
+            Dictionary from flat index to the value of every revealed
+            cell that isn't a zero.
+        
+        self._run_starts
+        self._run_ends
+            Sorted lists of the first and one past the last flat
+            index of each run of revealed zeroes.
+        
+        self._neighbours
+            Dictionary from flat index to the list of neighbours, of
+            the cells whose neighbours have been needed.
+        
+        self._frontier
+            Dictionary from flat index to the number of free
+            neighbours, of the visible cells that have free neighbours.
+            `frontier_i` returns it, `deserted_i` is computed when
+            called.  `flagged_neighbours_i` counts the flags when
+            called.
+        
+        self._axes
+        self._steps
+            (multiplier, size) for each axis, and the change in flat
+            index to each neighbour of a cell that isn't at an edge.
+    '''
+    def __init__(self, dimensions, moore=True, flagcount=True):
+        self.dimensions = dimensions
+        self.moore = moore
+        self.flagcount = flagcount
+        self.torus = False
+        self.accelerated = False
+        
+        self.callbacks = {
+            'input': (None, None),
+            'lose': (None, None),
+            'win': (None, None),
+        }
+        
+        self.N_DIMENSIONS = len(dimensions)
+        strides, deltas, self._moves = _generic_moves(dimensions, moore)
+        self.dimension_multiplier = strides
+        self._axes = list(zip(strides, dimensions))
+        self._steps = [step for checks, step in self._moves]
+        self.n_cells = 1
+        for size in dimensions:
+            self.n_cells *= size
+        self.max_neighbours = len(deltas)
+        self.clear()
+    
+    def clear(self):
+        self.free_cells = self.n_cells
+        self.mined = set()
+        self.flagged = set()
+        self._revealed = {}
+        self._run_starts = []
+        self._run_ends = []
+        self._neighbours = {}
+        self._frontier = {}
+        self.n_mines = 0
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        if self.flagcount:
+            self.flags_left = 0
+        else:
+            self.flags_left = None
+    
+    def coordinate_of(self, index):
+        coordinate = []
+        for multiplier in self.dimension_multiplier:
+            position, index = divmod(index, multiplier)
+            coordinate.append(position)
+        return tuple(coordinate)
+    
+    def _visible(self, index):
+        '''True if the cell at `index` has been revealed.'''
+        if index in self._revealed:
+            return True
+        run = bisect.bisect_right(self._run_starts, index) - 1
+        return run >= 0 and index < self._run_ends[run]
+    
+    def _add_run(self, start, end):
+        '''Add the run of revealed zeroes from `start` to `end - 1`.'''
+        starts = self._run_starts
+        ends = self._run_ends
+        run = bisect.bisect_left(starts, start)
+        # Merge with touching runs.
+        if run and ends[run - 1] == start:
+            run -= 1
+            start = starts.pop(run)
+            ends.pop(run)
+        if run < len(starts) and starts[run] == end:
+            starts.pop(run)
+            end = ends.pop(run)
+        starts.insert(run, start)
+        ends.insert(run, end)
+    
+    def get(self, coordinate):
+        return self.get_i(self.index_of(coordinate))
+    
+    def get_i(self, index):
+        if index in self.flagged:
+            return 'F'
+        value = self._revealed.get(index)
+        if value is not None:
+            return value
+        if self._visible(index):
+            return 0
+        return None
+    
+    def get_many(self, indices):
+        return list(map(self.get_i, indices))
+    
+    def flag_i(self, index, unflag=False):
+        # Only invisible (free or flagged) cell can be flagged or unflagged.
+        if not self._visible(index):
+            # No double-flag or double-unflag.
+            if (index in self.flagged) == bool(unflag):
+                # Don't unflag too many.
+                if self.flags_left or unflag or self.flags_left is None:
+                    if unflag:
+                        self.flagged.remove(index)
+                        change = -1
+                    else:
+                        self.flagged.add(index)
+                        change = 1
+                    if index in self.mined:
+                        self.correct_flags += change
+                    else:
+                        self.wrong_flags += change
+                    self.free_cells -= change
+                    if self.flagcount:
+                        self.flags_left -= change
+                    if unflag:
+                        self._track_freed(index)
+                    else:
+                        self._track_taken([index])
+                    self._call('input')
+        if not self.free_cells:
+            self._call('win')
+    
+    def _track_taken(self, indices):
+        '''
+        Update the frontier for the cells at `indices` that have just
+        been flagged or revealed.
+        '''
+        frontier = self._frontier
+        for index in indices:
+            for cell in self._compute_neighbours(index):
+                if cell in frontier:
+                    frontier[cell] -= 1
+                    if not frontier[cell]:
+                        del frontier[cell]
+        # Revealed zeroes never have free neighbours.
+        for index in indices:
+            if index in self._revealed:
+                free = 0
+                for cell in self._compute_neighbours(index):
+                    if cell not in self.flagged and not self._visible(cell):
+                        free += 1
+                if free:
+                    frontier[index] = free
+    
+    def _track_freed(self, index):
+        '''Update the frontier for the unflagged cell at `index`.'''
+        frontier = self._frontier
+        for cell in self._compute_neighbours(index):
+            if self._visible(cell):
+                frontier[cell] = frontier.get(cell, 0) + 1
+    
+    def frontier_i(self):
+        return self._frontier
+    
+    def _count_neighbours(self, index, value):
+        '''Count the neighbours of `index` where `get_i` is `value`.'''
+        count = 0
+        for cell in self.neighbours_i(index):
+            if self.get_i(cell) == value:
+                count += 1
+        return count
+    
+    def flagged_neighbours_i(self, index):
+        # Not kept, counted when needed.
+        return self._count_neighbours(index, 'F')
+    
+    def free_neighbours_i(self, index):
+        if self._visible(index):
+            return self._frontier.get(index, 0)
+        return self._count_neighbours(index, None)
+    
+    def incoming_i(self, index):
+        return self.neighbours_i(index)
+    
+    def deserted_i(self):
+        # Free cells next to visible cells are next to the frontier.
+        near = set()
+        for index in self._frontier:
+            near.update(self._compute_neighbours(index))
+        return set([
+            index for index in range(self.n_cells)
+            if index not in near and index not in self.flagged
+            and not self._visible(index)
+        ])
+    
+    def get_neighbours(self, coordinate):
+        return list(map(
+            self.coordinate_of,
+            self.neighbours_i(self.index_of(coordinate))
+        ))
+    
+    def neighbours_i(self, index):
+        v = self._neighbours.get(index)
+        if v is None:
+            v = self._neighbours[index] = self._compute_neighbours(index)
+        return v
+    
+    def second_neighbours_i(self, index):
+        return _second_neighbours(self.neighbours_i, index)
+    
+    def _compute_neighbours(self, index):
+        '''`neighbours_i` without the cache, used by `_flood`.'''
+        coordinate = []
+        interior = True
+        rest = index
+        for multiplier, size in self._axes:
+            position, rest = divmod(rest, multiplier)
+            coordinate.append(position)
+            if not 0 < position < size - 1:
+                interior = False
+        if interior:
+            return [index + step for step in self._steps]
+        dimensions = self.dimensions
+        v = []
+        for checks, step in self._moves:
+            for axis, d in checks:
+                if not 0 <= coordinate[axis] + d < dimensions[axis]:
+                    break
+            else:
+                v.append(index + step)
+        return v
+    
+    def all_cells(self):
+        return list(itertools.product(
+            *[range(size) for size in self.dimensions]
+        ))
+    
+    def reveal(self, coordinate):
+        return list(map(
+            self.coordinate_of,
+            self.reveal_i(self.index_of(coordinate))
+        ))
+    
+    def _reveal(self, indices):
+        revealed = []
+        lose = False
+        for index in indices:
+            if index in self.flagged or self._visible(index):
+                continue
+            lose = lose or index in self.mined
+            flooded = self._flood(index)
+            self._track_taken(flooded)
+            revealed.extend(flooded)
+        self.free_cells -= len(revealed)
+        # Final callbacks
+        self._call('input')
+        if lose:
+            self._call('lose')
+        elif not self.free_cells:
+            self._call('win')
+        return revealed
+    
+    def _flood(self, index):
+        mined = self.mined
+        flagged = self.flagged
+        queued = set([index])
+        revealed = [index]
+        zeroes = []
+        i = 0
+        compute_neighbours = self._compute_neighbours
+        visible = self._visible
+        while i < len(revealed):
+            index = revealed[i]
+            i += 1
+            neighbours = compute_neighbours(index)
+            number = len(mined.intersection(neighbours))
+            if index in mined:
+                self._revealed[index] = 'X'
+            elif number:
+                self._revealed[index] = number
+            else:
+                zeroes.append(index)
+            # Field of zeroes.
+            if not number:
+                for neighbour in neighbours:
+                    if neighbour in queued or neighbour in flagged:
+                        continue
+                    if not visible(neighbour):
+                        queued.add(neighbour)
+                        revealed.append(neighbour)
+        # Store the zeroes as runs.
+        zeroes.sort()
+        start = 0
+        for i in range(1, len(zeroes) + 1):
+            if i == len(zeroes) or zeroes[i] != zeroes[i - 1] + 1:
+                self._add_run(zeroes[start], zeroes[i - 1] + 1)
+                start = i
+        return revealed
+    
+    def fill_i(self, indices):
+        self.n_mines = len(indices)
+        if self.flagcount:
+            self.flags_left = len(indices)
+        self.mined = set(indices)
+        # Sanity checking.
+        assert len(self.mined) == len(indices)
+    
+    def reseed_i(self, indices, start):
+        self.clear()
+        self.fill_i(indices)
+        self.reveal_i(start)
+    
+    def _unsupported(self, *ignore):
+        raise NotImplementedError('Not supported by sparse fields')
+    snapshot = restore = discard = _unsupported
+    set_journal = drain_changes = dumps = save = share = _unsupported
+    state_hash = state_hash_i = layout_hash = export_state = _unsupported
+
+
+class _tile():
+    '''
+    One tile of a `chunked_field`.
+    
+        self.state      bytearray of state codes, by local index.
+        self.mines      Set of the local indices of the mines.
+        self.left       Number of unrevealed cells that aren't mines.
+        self.used       When the tile was last used.
+        self.dirty      True if `self.state` has changed since the tile
+                        was generated or loaded.
+    '''
+    def __init__(self, state, mines, left):
+        self.state = state
+        self.mines = mines
+        self.left = left
+        self.used = 0
+        self.dirty = False
+
+
+class chunked_field(sparse_field):
+    '''
+    A field split into square tiles that are generated when they are
+    first needed, for fields that are far too large to ever exist in
+    memory.
+    
+        __init__(self, dimensions, density, moore=True, flagcount=True,
+                 seed=None, tile_size=64, max_tiles=64, directory=None)
+            `density` is the fraction of the cells that are mines.
+            
+            The mines in a tile are chosen by a generator seeded from
+            `seed` and the number of the tile, so the same seed gives
+            the same field (on the same version of Python).  A random
+            seed is used if `seed` is None.
+            
+            At most `max_tiles` tiles are kept in memory.  Tiles that
+            have been played on are written to files in `directory`
+            when they are evicted.  A temporary directory is created
+            when needed if `directory` is None.
+    
+    Memory use and the time it takes to create or clear the field do
+    not depend on the size of the field.
+    
+    The mines can't be chosen by `fill`, use
+        set_start(index)
+            Make sure that the cell at `index` and its neighbours are
+            not mines.  MUST be called after `clear` and before
+            anything else.
+    
+        page_in(first, last)
+            Load the tiles that cover the box from coordinate `first`
+            to `last` (inclusive) and keep them in memory until the
+            next call.  Used by the curses interface to page in the
+            visible area.
+    
+        close()
+            Remove the files of evicted tiles.
+    
+    `all_cells` is not usable on large fields, and `frontier_i` and
+    `deserted_i` are not supported.
+    
+    See the doc-string for `sparse_field` for everything else.
+    
+    
+    Internal
+    ========
+    
+        self._tiles
+            Dictionary from tile number to `_tile`, of the tiles in
+            memory.
+        
+        self._on_disk
+            Set of the numbers of the tiles that have files.
+        
+        self._tile_axes
+            (multiplier, tile multiplier, local multiplier) for each
+            axis.  Tiles are numbered like cells, and so are the cells
+            in a tile (local indices).
+        
+        self._safe
+            Set of the flat indices given to `set_start`.
+    '''
+    def __init__(self, dimensions, density, moore=True, flagcount=True,
+            seed=None, tile_size=64, max_tiles=64, directory=None):
+        assert 0 <= density < 1
+        assert max_tiles > 3**len(dimensions), "Can't hold a neighbourhood"
+        if seed is None:
+            seed = int(binascii.hexlify(os.urandom(16)), 16)
+        self.density = density
+        self.seed = seed
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.directory = directory
+        self._own_directory = False
+        self._tiles = {}
+        self._on_disk = set()
+        self.n_tiles = 1
+        tile_multipliers = []
+        for size in reversed(dimensions):
+            tile_multipliers.insert(0, self.n_tiles)
+            self.n_tiles *= -(-size // tile_size)
+        local_multipliers = [
+            tile_size ** (len(dimensions) - axis - 1)
+            for axis in range(len(dimensions))
+        ]
+        sparse_field.__init__(self, dimensions, moore, flagcount)
+        self._tile_axes = list(zip(
+            self.dimension_multiplier, tile_multipliers, local_multipliers
+        ))
+        # Numbers, free, flagged and revealed mine.
+        assert self.max_neighbours + 3 < 256
+        self.S_FREE = self.max_neighbours + 1
+        self.S_FLAG = self.max_neighbours + 2
+        self.S_MINE = self.max_neighbours + 3
+        self.decode = list(range(self.max_neighbours + 1)) + [None, 'F', 'X']
+    
+    def clear(self):
+        self._remove_files()
+        self._tiles = {}
+        self._pinned = set()
+        self._clock = 0
+        self._safe = set()
+        self.free_cells = self.n_cells
+        self.correct_flags = 0
+        self.wrong_flags = 0
+        # The number of mines is known without generating any tiles,
+        # there are at most 2**N_DIMENSIONS different sizes of tiles.
+        sizes = []
+        for size in self.dimensions:
+            full, edge = divmod(size, self.tile_size)
+            sizes.append([(full, self.tile_size)] * bool(full))
+            if edge:
+                sizes[-1].append((1, edge))
+        self.n_mines = 0
+        for combination in itertools.product(*sizes):
+            count = cells = 1
+            for n, size in combination:
+                count *= n
+                cells *= size
+            self.n_mines += count * self._mine_count(cells)
+        if self.flagcount:
+            self.flags_left = self.n_mines
+        else:
+            self.flags_left = None
+    
+    def _mine_count(self, cells):
+        '''Number of mines in a tile with `cells` cells.'''
+        return int(self.density * cells + 0.5)
+    
+    def set_start(self, index):
+        self._safe = set([index] + self._compute_neighbours(index))
+        # Tiles generated without knowing the safe cells are wrong.
+        self._tiles = {}
+        # A tiny tile at an edge may not have room for all its mines.
+        tiles = {}
+        for safe in self._safe:
+            key, local = self._locate(safe)
+            tiles[key] = tiles.get(key, 0) + 1
+        for key in tiles:
+            cells = len(self._tile_cells(key))
+            missing = self._mine_count(cells) - (cells - tiles[key])
+            if missing > 0:
+                self.n_mines -= missing
+                if self.flagcount:
+                    self.flags_left -= missing
+    
+    def _locate(self, index):
+        '''Return (tile number, local index) of the cell at `index`.'''
+        key = local = 0
+        tile_size = self.tile_size
+        for multiplier, tile_multiplier, local_multiplier in self._tile_axes:
+            position, index = divmod(index, multiplier)
+            tile, position = divmod(position, tile_size)
+            key += tile * tile_multiplier
+            local += position * local_multiplier
+        return key, local
+    
+    def _tile_cells(self, key):
+        '''Return a list of (local index, flat index) in the tile.'''
+        ranges = []
+        for (multiplier, tile_multiplier, local_multiplier), size in zip(
+            self._tile_axes, self.dimensions
+        ):
+            tile, key = divmod(key, tile_multiplier)
+            start = tile * self.tile_size
+            ranges.append(range(start, min(start + self.tile_size, size)))
+        cells = []
+        for coordinate in itertools.product(*ranges):
+            index = local = 0
+            for position, (multiplier, ignore, local_multiplier) in zip(
+                coordinate, self._tile_axes
+            ):
+                index += position * multiplier
+                local += position % self.tile_size * local_multiplier
+            cells.append((local, index))
+        return cells
+    
+    def _tile(self, key):
+        '''Return the tile `key`, loading or generating it if needed.'''
+        tile = self._tiles.get(key)
+        if tile is None:
+            if len(self._tiles) >= self.max_tiles:
+                self._evict()
+            if key in self._on_disk:
+                tile = self._read(key)
+            else:
+                tile = self._generate(key)
+            self._tiles[key] = tile
+        self._clock += 1
+        tile.used = self._clock
+        return tile
+    
+    def _generate(self, key):
+        cells = self._tile_cells(key)
+        candidates = [
+            local for local, index in cells if index not in self._safe
+        ]
+        rng = random.Random(self.seed * self.n_tiles + key)
+        n_mines = min(self._mine_count(len(cells)), len(candidates))
+        mines = set(rng.sample(candidates, n_mines))
+        state = bytearray([self.S_FREE]) * self.tile_size**self.N_DIMENSIONS
+        return _tile(state, mines, len(cells) - n_mines)
+    
+    def _filename(self, key):
+        return os.path.join(self.directory, '{0}.tile'.format(key))
+    
+    def _read(self, key):
+        f = open(self._filename(key), 'rb')
+        data = f.read()
+        f.close()
+        tile = self._generate(key)
+        tile.left = struct.unpack('>L', data[:4])[0]
+        tile.state = bytearray(data[4:])
+        return tile
+    
+    def _evict(self):
+        '''
+        Evict one tile:  an unmodified or finished one if possible,
+        otherwise the least recently used one.  Paged in tiles stay
+        unless there is nothing else.
+        '''
+        def badness(key):
+            tile = self._tiles[key]
+            return (key in self._pinned, tile.dirty and tile.left, tile.used)
+        key = min(self._tiles, key=badness)
+        tile = self._tiles.pop(key)
+        if tile.dirty:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix='anonymine-')
+                self._own_directory = True
+            f = open(self._filename(key), 'wb')
+            f.write(struct.pack('>L', tile.left) + bytes(tile.state))
+            f.close()
+            self._on_disk.add(key)
+    
+    def _remove_files(self):
+        for key in self._on_disk:
+            os.remove(self._filename(key))
+        self._on_disk = set()
+    
+    def close(self):
+        self._remove_files()
+        if self._own_directory:
+            os.rmdir(self.directory)
+            self.directory = None
+            self._own_directory = False
+    
+    def page_in(self, first, last):
+        ranges = []
+        for low, high, size in zip(first, last, self.dimensions):
+            low = max(0, low) // self.tile_size
+            high = min(size - 1, high) // self.tile_size
+            ranges.append(range(low, high + 1))
+        self._pinned = set()
+        for tile in itertools.product(*ranges):
+            key = 0
+            for position, axis in zip(tile, self._tile_axes):
+                key += position * axis[1]
+            self._pinned.add(key)
+        for key in self._pinned:
+            self._tile(key)
+    
+    def _code(self, index):
+        key, local = self._locate(index)
+        return self._tile(key).state[local]
+    
+    def _is_mine(self, index):
+        key, local = self._locate(index)
+        return local in self._tile(key).mines
+    
+    def _visible(self, index):
+        code = self._code(index)
+        return code < self.S_FREE or code == self.S_MINE
+    
+    def get_i(self, index):
+        return self.decode[self._code(index)]
+    
+    def neighbours_i(self, index):
+        return self._compute_neighbours(index)
+    
+    def flag_i(self, index, unflag=False):
+        key, local = self._locate(index)
+        tile = self._tile(key)
+        code = tile.state[local]
+        # Only invisible (free or flagged) cell can be flagged or unflagged.
+        if code in (self.S_FREE, self.S_FLAG):
+            # No double-flag or double-unflag.
+            if (code == self.S_FLAG) == bool(unflag):
+                # Don't unflag too many.
+                if self.flags_left or unflag or self.flags_left is None:
+                    if unflag:
+                        tile.state[local] = self.S_FREE
+                        change = -1
+                    else:
+                        tile.state[local] = self.S_FLAG
+                        change = 1
+                    tile.dirty = True
+                    if local in tile.mines:
+                        self.correct_flags += change
+                    else:
+                        self.wrong_flags += change
+                    self.free_cells -= change
+                    if self.flagcount:
+                        self.flags_left -= change
+                    self._call('input')
+        if not self.free_cells:
+            self._call('win')
+    
+    def _reveal(self, indices):
+        revealed = []
+        lose = False
+        for index in indices:
+            if self._code(index) != self.S_FREE:
+                continue
+            lose = lose or self._is_mine(index)
+            revealed.extend(self._flood(index))
+        self.free_cells -= len(revealed)
+        # Final callbacks
+        self._call('input')
+        if lose:
+            self._call('lose')
+        elif not self.free_cells:
+            self._call('win')
+        return revealed
+    
+    def _flood(self, index):
+        queued = set([index])
+        revealed = [index]
+        i = 0
+        while i < len(revealed):
+            index = revealed[i]
+            i += 1
+            neighbours = self._compute_neighbours(index)
+            number = 0
+            for neighbour in neighbours:
+                if self._is_mine(neighbour):
+                    number += 1
+            # Don't hold on to the tile, counting may have evicted it.
+            key, local = self._locate(index)
+            tile = self._tile(key)
+            tile.dirty = True
+            if local in tile.mines:
+                tile.state[local] = self.S_MINE
+            else:
+                tile.state[local] = number
+                tile.left -= 1
+            # Field of zeroes.
+            if not number:
+                for neighbour in neighbours:
+                    if neighbour in queued:
+                        continue
+                    if self._code(neighbour) == self.S_FREE:
+                        queued.add(neighbour)
+                        revealed.append(neighbour)
+        return revealed
+    
+    def free_neighbours_i(self, index):
+        return self._count_neighbours(index, None)
+    
+    fill_i = reseed_i = sparse_field._unsupported
+    frontier_i = deserted_i = sparse_field._unsupported
+
+
+# See `_topology.zobrist`.
+_zobrist_seed = 0x616e6f6e
+_zobrist_mask = (1 << 64) - 1
+
+_SAVE_MAGIC = b'AMFD'
+_SAVE_VERSION = 1
+_SAVE_FLAGCOUNT = 1
+_SAVE_TORUS = 2
+_IMAGE_MAGIC = b'AMFI'
+# n_mines, correct_flags, wrong_flags, free_cells, flags_left and the
+# two hashes, see `field_image`.
+_IMAGE_COUNTERS = '>5q2Q'
+# What `field_image.view` refuses and `field_image.child` copies for.
+_IMAGE_WRITERS = (
+    'clear', 'flag_i', 'reveal_i', 'chord_i', 'fill_i', 'reseed_i', 'restore'
+)
+# `load` uses mmap for files at least this big.
+_mmap_threshold = 1 << 20
+# bytearray.translate tables between bits and binary digits.
+_bits_to_digits = bytearray(range(256))
+_bits_to_digits[0:2] = b'01'
+_bits_to_digits = bytes(_bits_to_digits)
+_digits_to_bits = bytearray(range(256))
+_digits_to_bits[48:50] = b'\x00\x01'
+_digits_to_bits = bytes(_digits_to_bits)
+# For `bitboard_field`.
+_hex_digits_to_bytes = bytearray(range(256))
+_hex_digits_to_bytes[48:58] = bytearray(range(10))
+_hex_digits_to_bytes = bytes(_hex_digits_to_bytes)
+_zero_to_digit_bits = bytes(bytearray([1] + [0] * 255))
+
+
+def _array_bytes(a):
+    '''The contents of the array.array `a` as bytes.'''
+    if 'tobytes' in dir(a):
+        return a.tobytes()
+    return a.tostring()     # Python 2
+
+
+def _pack_bits(bits):
+    '''Pack a bytearray of zeroes and ones into a bitset, see `dumps`.'''
+    n_bytes = (len(bits) + 7) // 8
+    if not n_bytes:
+        return b''
+    digits = bits.translate(_bits_to_digits)
+    digits += b'0' * (8*n_bytes - len(bits))
+    # Let int do the packing.
+    return binascii.unhexlify(
+        '{0:0{1}x}'.format(int(bytes(digits), 2), 2*n_bytes)
+    )
+
+
+def _unpack_bits(data, n):
+    '''Inverse of `_pack_bits`, `n` is the number of bits.'''
+    if not n:
+        return bytearray()
+    digits = '{0:0{1}b}'.format(
+        int(binascii.hexlify(data), 16), 8*len(data)
+    )
+    return bytearray(digits[:n].encode('ascii')).translate(_digits_to_bits)
+
+
+def _read_header(data, magic):
+    '''
+    Read the header of a save file or a `field_image` from `data`.
+    
+    Returns (kind, flagcount, torus, dimensions, number of cells,
+    offset of the first byte after the header).
+    
+    Raises ValueError if `data` doesn't start with a valid header.
+    '''
+    if bytes(data[:4]) != magic:
+        raise ValueError('Not an anonymine field')
+    try:
+        version, kind, options, n_dimensions = struct.unpack_from(
+            '>BcBB', data, 4
+        )
+        if version != _SAVE_VERSION:
+            raise ValueError('Unsupported version {0}'.format(version))
+        dimensions = list(struct.unpack_from(
+            '>{0}I'.format(n_dimensions), data, 8
+        ))
+    except struct.error:
+        raise ValueError('Truncated header')
+    n = 1
+    for size in dimensions:
+        n *= size
+    flagcount = bool(options & _SAVE_FLAGCOUNT)
+    torus = bool(options & _SAVE_TORUS)
+    return kind, flagcount, torus, dimensions, n, 8 + 4*n_dimensions
+
+
+def _new_field(kind, dimensions, flagcount, torus):
+    '''Create an empty field of a kind from `_read_header`.'''
+    if kind == b'H' and len(dimensions) == 2:
+        if torus and dimensions[1] % 2:
+            raise ValueError('Odd height on a torus')
+        return hexagonal_field(dimensions[0], dimensions[1], flagcount, torus)
+    elif kind in (b'M', b'N'):
+        return generic_field(dimensions, kind == b'M', flagcount, torus)
+    else:
+        raise ValueError('Unknown kind of field')
+
+
+def loads(data):
+    '''
+    Create a field from the output of `generic_field.dumps`.
+    
+    `data` may be anything that can be sliced into bytes, like the
+    contents of a file or an `mmap.mmap`.
+    
+    Raises ValueError if `data` is not a valid field.
+    '''
+    kind, flagcount, torus, dimensions, n, offset = _read_header(
+        data, _SAVE_MAGIC
+    )
+    n_bytes = (n + 7) // 8
+    if len(data) != offset + 3*n_bytes:
+        raise ValueError('Wrong size')
+    field = _new_field(kind, dimensions, flagcount, torus)
+    mined, flagged, visible = [
+        data[start:start + n_bytes]
+        for start in range(offset, offset + 3*n_bytes, n_bytes)
+    ]
+    # Overlap check without unpacking.
+    overlap = int(binascii.hexlify(flagged) or b'0', 16)
+    overlap &= int(binascii.hexlify(visible) or b'0', 16)
+    if overlap:
+        raise ValueError('Cell both flagged and revealed')
+    field._load_bits(
+        _unpack_bits(mined, n),
+        _unpack_bits(flagged, n),
+        _unpack_bits(visible, n)
+    )
+    return field
+
+
+def load(filename):
+    '''
+    Read a field saved with `generic_field.save`.
+    
+    Large files are mapped with mmap instead of read.
+    '''
+    f = open(filename, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size < _mmap_threshold:
+            return loads(f.read())
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return loads(data)
+        finally:
+            data.close()
+    finally:
+        f.close()
+
+
+class field_image():
+    '''
+    A copy of a `generic_field` or a `hexagonal_field` in a
+    `multiprocessing.shared_memory` block, so that worker processes
+    can use the field without pickling it or creating it again.
+    Requires Python 3.8 or later.
+    
+        image = field.share()
+            In the parent.  The image is a copy of the field as it is
+            now, later changes to `field` are not seen by the image.
+        
+        image = attach(name)
+            In a worker, `name` is `image.name` from the parent.
+        
+        image.view()
+            A read-only field on top of the block.  Everything that
+            only looks at the field works without copying it; `flag`,
+            `reveal`, `chord`, `fill`, `reseed`, `restore` and `clear`
+            raise TypeError.
+        
+        image.child()
+            A copy-on-write field for speculative moves:  It reads from
+            the block until the first `flag`, `reveal`, `chord`, `fill`,
+            `reseed`, `restore` or `clear`, which first copies the
+            arrays into the process.
+        
+        image.close()
+            In every process, once its views are gone (BufferError
+            otherwise).  Children that have been written to no longer
+            use the block.
+        
+        image.unlink()
+            Once, in the parent, when no process needs the block
+            anymore.
+    
+    The neighbour tables are not in the block, each process compiles
+    (or already has) its own `_topology`.  A `bitboard_field` comes
+    back as a `generic_field`.
+    
+    
+    Layout of the block
+    ===================
+    
+        The header of `generic_field.dumps`, with b'AMFI' instead
+        of b'AMFD'.
+        
+        `_IMAGE_COUNTERS`, big endian:
+            int64       n_mines
+            int64       correct_flags
+            int64       wrong_flags
+            int64       free_cells
+            int64       flags_left, -1 for None
+            uint64      State hash
+            uint64      Layout hash
+        
+        Padded to a multiple of 8 bytes:
+            bytearray   mined
+            bytearray   flagged
+            bytearray   visible
+        
+        Padded to a multiple of 8 bytes, arrays of `field.typecode`
+        in the native byte order:
+            numbers
+            state
+            _free_neighbours
+            _flagged_neighbours
+    '''
+    def __init__(self, field=None, name=None):
+        '''
+        Use `generic_field.share` or `attach` instead.
+        
+        Creates a new block with a copy of `field`, or attaches to the
+        block called `name`.
+        '''
+        if field is not None:
+            header = field._header(_IMAGE_MAGIC)
+            layout = self._layout(
+                len(header), field.n_cells,
+                array.array(field.typecode).itemsize
+            )
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=max(layout[-1][1], 1)
+            )
+            buf = self._memory.buf
+            buf[:len(header)] = header
+            flags_left = field.flags_left
+            if flags_left is None:
+                flags_left = -1
+            struct.pack_into(
+                _IMAGE_COUNTERS, buf, len(header),
+                field.n_mines, field.correct_flags, field.wrong_flags,
+                field.free_cells, flags_left, field._hash, field._layout_hash
+            )
+            for (start, end), a in zip(layout, [
+                field.mined, field.flagged, field.visible,
+                field.numbers, field.state,
+                field._free_neighbours, field._flagged_neighbours,
+            ]):
+                buf[start:end] = memoryview(a).cast('B')
+        else:
+            # Python 3.13 can be told not to let this process' resource
+            # tracker unlink the block when the process exits.
+            try:
+                self._memory = shared_memory.SharedMemory(
+                    name=name, track=False
+                )
+            except TypeError:
+                self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+    
+    def _layout(self, header_size, n, itemsize):
+        '''
+        The (start, end) offsets of the seven arrays in the order of
+        the doc-string.
+        '''
+        start = header_size + struct.calcsize(_IMAGE_COUNTERS)
+        layout = []
+        for size in (1, 1, 1, itemsize, itemsize, itemsize, itemsize):
+            if len(layout) in (0, 3):
+                start += -start % 8
+            layout.append((start, start + n*size))
+            start += n*size
+        return layout
+    
+    def _field(self):
+        '''Create a field that reads its arrays from the block.'''
+        buf = self._memory.buf.toreadonly()
+        kind, flagcount, torus, dimensions, n, offset = _read_header(
+            buf, _IMAGE_MAGIC
+        )
+        field = _new_field(kind, dimensions, flagcount, torus)
+        (
+            field.n_mines, field.correct_flags, field.wrong_flags,
+            field.free_cells, field.flags_left, field._hash,
+            field._layout_hash
+        ) = struct.unpack_from(_IMAGE_COUNTERS, buf, offset)
+        if field.flags_left < 0:
+            field.flags_left = None
+        layout = self._layout(
+            offset, n, array.array(field.typecode).itemsize
+        )
+        field.mined, field.flagged, field.visible = [
+            buf[start:end] for start, end in layout[:3]
+        ]
+        (
+            field.numbers, field.state,
+            field._free_neighbours, field._flagged_neighbours,
+        ) = [
+            buf[start:end].cast(field.typecode) for start, end in layout[3:]
+        ]
+        cells = range(n)
+        field._mine_indices = list(itertools.compress(cells, field.mined))
+        free = field._free_neighbours
+        field._frontier = set([
+            index for index in itertools.compress(cells, field.visible)
+            if free[index]
+        ])
+        # The memoryviews need the block.
+        field._image = self
+        # `export_state` would slice the memoryview.  (No references
+        # back to `field`, the views must go away without the garbage
+        # collector so that the block can be closed.)
+        state, typecode = field.state, field.typecode
+        field.export_state = lambda: array.array(typecode, state.tobytes())
+        return field
+    
+    def view(self):
+        '''A read-only field on top of the block.'''
+        field = self._field()
+        for name in _IMAGE_WRITERS:
+            setattr(field, name, _read_only)
+        return field
+    
+    def child(self):
+        '''A copy-on-write field on top of the block.'''
+        field = self._field()
+        # A weak reference, like `export_state` in `_field`.
+        ref = weakref.ref(field)
+        def copy_on_write(method):
+            def write(*args, **kwargs):
+                field = ref()
+                _copy_image(field)
+                return method(field, *args, **kwargs)
+            return write
+        for name in _IMAGE_WRITERS:
+            setattr(field, name, copy_on_write(getattr(field.__class__, name)))
+        return field
+    
+    def close(self):
+        '''Stop using the block in this process.'''
+        self._memory.close()
+    
+    def unlink(self):
+        '''Free the block, see `multiprocessing.shared_memory`.'''
+        self._memory.unlink()
+
+
+def _copy_image(field):
+    '''
+    Copy the arrays of a `field_image.child` into the process and go
+    back to the methods of the class.
+    '''
+    for name in ('mined', 'flagged', 'visible'):
+        setattr(field, name, bytearray(getattr(field, name)))
+    for name in (
+        'numbers', 'state', '_free_neighbours', '_flagged_neighbours'
+    ):
+        setattr(field, name, array.array(
+            field.typecode, getattr(field, name).tobytes()
+        ))
+    for name in _IMAGE_WRITERS + ('export_state',):
+        delattr(field, name)
+    field._image = None
+
+
+def _read_only(*ignore):
+    raise TypeError('Read-only view of a shared field')
+
+
+def attach(name):
+    '''
+    Attach to the `field_image` called `name`, created by
+    `generic_field.share` in another process.
+    '''
+    if shared_memory is None:
+        raise NotImplementedError('Shared memory requires Python 3.8')
+    return field_image(name=name)
+
+
+import array
+import binascii
+import bisect
+import itertools
+import mmap
+import operator
 import os
+import random
+import struct
 import sys
+import tempfile
+import weakref
 assert __name__ != '__main__', "I'm not a script."
 
+# Optional, see `generic_field.accelerated`.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+_numpy_threshold = 1000
+
+# Optional, see `field_image`.  Python 3.8 and later.
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
 try:
     assert os.geteuid() or sys.platform.startswith('haiku'), "Gaming as root!"
 except AttributeError:
@@ -384,6 +384,11 @@ Algorithm for solving and measuring the difficulty of minesweepers
         and 3 would be simple to implement and would probably not be
         ridiculously inefficient.
         
+        The unsolved cells that don't share any free neighbours can't
+        affect each other, so each such component is brute-forced on
+        its own, and the lowest number of mines of the field is the
+        sum of the components'.
+        
         Rule 3 will automatically be included when checking if
         (min == flags).
         
@@ -471,6 +476,7 @@ Algorithm for solving and measuring the difficulty of minesweepers
             * 3-dimensional? No problem.
             * Von-Neumann neighbourhood? No problem.
             * Something weird? Also, no problem.
+              (See `anonymine_fields.graph_field`.)
         
         Because of the very generic coordinate data type, the field
         object MUST provide certain methods:
@@ -510,10 +516,70 @@ Algorithm for solving and measuring the difficulty of minesweepers
         Apart from the actual field, there is also the optional flags
         left count.  field.flags_left is an integer if it is available,
         but `None` if it is not.
+        
+        If the field also provides the flat index API of
+        `anonymine_fields.generic_field` (`get_i`, `neighbours_i`,
+        `flag_i`, `reveal_i` and `n_cells`), the solver will work on
+        the plain integer indices instead of the coordinates.  See
+        `index_view`.
+        
+        If it also provides `frontier_i` and `deserted_i`, the solver
+        will use them instead of looking at every cell to find the
+        unsolved and deserted cells.  And if it provides `incoming_i`,
+        `flagged_neighbours_i` and `free_neighbours_i`, `conflict`
+        will use the counts instead of counting.
 '''
 
 import time
 
+class index_view():
+    '''
+    Wrap a field that has the flat index API so that the flat indices
+    are its coordinates.  The solver uses this internally; integers are
+    much cheaper to compare and hash than tuples.
+    
+    Anything not listed here is looked up on the real field.
+    '''
+    def __init__(self, field):
+        self.field = field
+        self.get = field.get_i
+        self.get_neighbours = field.neighbours_i
+        self.flag = field.flag_i
+        self.unflag = field.unflag_i
+        self.reveal = field.reveal_i
+        if 'frontier_i' in dir(field):
+            self.frontier = field.frontier_i
+            self.deserted = field.deserted_i
+        if 'second_neighbours_i' in dir(field):
+            self.second_neighbours = field.second_neighbours_i
+        self.counted = 'incoming_i' in dir(field)
+        if self.counted:
+            self.incoming = field.incoming_i
+            self.flagged_neighbours = field.flagged_neighbours_i
+            self.free_neighbours = field.free_neighbours_i
+    
+    def all_cells(self):
+        return list(range(self.field.n_cells))
+    
+    def second_neighbours(self, cell):
+        '''
+        The neighbours of the neighbours of `cell`, without `cell`, in
+        the order they are first found.  For fields that don't have
+        `second_neighbours_i`.
+        '''
+        seen = set([cell])
+        cells = []
+        for neighbour in self.get_neighbours(cell):
+            for second in self.get_neighbours(neighbour):
+                if second not in seen:
+                    seen.add(second)
+                    cells.append(second)
+        return cells
+    
+    def __getattr__(self, name):
+        return getattr(self.field, name)
+
+
 class solver():
     '''
     The reason why this is a class rather than a function is quite
@@ -569,6 +635,22 @@ class solver():
         NOTICE:  The levels -1 and -2 have special meanings.  And
         especially -2 does NOT mean "ridiculously" easy.
     
+    
+    mode
+    ====
+    
+            s.mode = 'constraints'
+        The default mode 'possibilities' is the tree of possibilities
+        described in the doc-string of this module.
+        
+        In the 'constraints' mode, every unsolved cell is instead a
+        constraint "these free cells have this many mines", and the
+        constraints are compared with each other (see `propagate`).
+        That is much faster, and the result of `solve` is the same
+        for most fields, but not all:  It can't solve what needs three
+        constraints at once, but it follows subtracted subsets and the
+        flags left further than the possibilities usually do.
+        The difficulty levels are mapped onto the same rules.
     '''
     
     def __dir__(self):
@@ -578,6 +660,7 @@ class solver():
             'field',
             'statistics',
             'solve',
+            'mode',
         ]
     
     def __hash__(self):
@@ -589,6 +672,7 @@ class solver():
         '''
         self.field = None
         self.statistics = []
+        self.mode = 'possibilities'
     
     def combinator(self, elements, n):
         '''
@@ -635,6 +719,8 @@ class solver():
         neighbours.)
         
         '''
+        if isinstance(self.field, index_view) and self.field.counted:
+            return self.counted_conflict(new_flags, exact)
         # Find number neighbours to all new flags.
         neighbours = self.number_neighbours(new_flags)
         # Iterate over each neighbour.
@@ -656,6 +742,38 @@ class solver():
         # Hopefully reached.
         return False
     
+    def counted_conflict(self, new_flags, exact):
+        '''
+        `conflict` for an `index_view` of a field that counts the
+        flagged and free neighbours of every cell.
+        '''
+        field = self.field
+        # Count the new flags around each cell and find the number
+        # neighbours.  Only whether there is a conflict matters, so
+        # the order they are checked in doesn't.
+        new_counts = {}
+        neighbours = set()
+        for new_flag in set(new_flags):
+            if field.get(new_flag) != 'F':
+                for cell in field.incoming(new_flag):
+                    new_counts[cell] = new_counts.get(cell, 0) + 1
+            neighbours.update(field.get_neighbours(new_flag))
+        for neighbour in neighbours:
+            target = field.get(neighbour)
+            if target is None or target == 'F':
+                continue
+            flag_count = (
+                field.flagged_neighbours(neighbour)
+                + new_counts.get(neighbour, 0)
+            )
+            free_count = field.free_neighbours(neighbour)
+            # Check for conflict. Too many or not room for enough.
+            if flag_count > target or free_count < target - flag_count:
+                return True
+            if flag_count < target and exact:
+                return True
+        return False
+    
     def possibilities(self, cell, parent_possibility, count_flags=False):
         '''
         Return a list of combinations of coordinates where the
@@ -730,9 +848,16 @@ class solver():
         
         # All number neighbours to all (any-form-of) neighbours to the parent
         # cell are relevant.
-        child_cells = self.field.get_neighbours(parent_cell)
-        child_cells = self.number_neighbours(child_cells)
-        child_cells = list(filter(lambda x: x != parent_cell, child_cells))
+        if isinstance(self.field, index_view):
+            # Same cells in the same order, from a shared table.
+            child_cells = [
+                cell for cell in self.field.second_neighbours(parent_cell)
+                if self.field.get(cell) not in (None, 'F')
+            ]
+        else:
+            child_cells = self.field.get_neighbours(parent_cell)
+            child_cells = self.number_neighbours(child_cells)
+            child_cells = list(filter(lambda x: x != parent_cell, child_cells))
         # If the parent cell itself could be included, it would allow a
         # secondary possibility to be identical to the primary
         # possibility, forcing it to be possible.
@@ -893,10 +1018,303 @@ class solver():
                     return True
         return False
     
+    def unsolved_cells(self):
+        '''
+        Return a list of the unsolved cells, in the same order as
+        `field.all_cells()`.
+        '''
+        if 'frontier' in dir(self.field):
+            # Only an `index_view` has it, the cells are flat indices.
+            return sorted(self.field.frontier())
+        return list(filter(self.unsolved, self.field.all_cells()))
+    
+    def free_cells(self):
+        '''
+        Return (bordering, deserted), lists of the free cells that are
+        and aren't neighbours of unsolved cells, in the same order as
+        `field.all_cells()`.
+        '''
+        if 'frontier' in dir(self.field):
+            bordering = set()
+            for cell in self.field.frontier():
+                for neighbour in self.field.get_neighbours(cell):
+                    if self.field.get(neighbour) is None:
+                        bordering.add(neighbour)
+            return sorted(bordering), sorted(self.field.deserted())
+        unsolved_cells = self.unsolved_cells()
+        bordering = []
+        deserted = []
+        for cell in self.field.all_cells():
+            if self.field.get(cell) is None:
+                for unsolved_cell in unsolved_cells:
+                    if cell in self.field.get_neighbours(unsolved_cell):
+                        bordering.append(cell)
+                        break # Fix another bug as well. # 0.0.25
+                else:
+                    # 0.0.25
+                    # The BUG WAS here. The 'else' statement belonged to the
+                    # 'if' statement rather than to the 'for' statement.
+                    # Check the comment at the top of `rule9bf`.
+                    deserted.append(cell)
+        return bordering, deserted
+    
+    def constraint(self, cell):
+        '''
+        Return (free, mines), a list of the free neighbours of the
+        number `cell` and how many mines there are among them.
+        '''
+        free = []
+        flags = 0
+        for neighbour in self.field.get_neighbours(cell):
+            value = self.field.get(neighbour)
+            if value is None:
+                free.append(neighbour)
+            elif value == 'F':
+                flags += 1
+        return free, self.field.get(cell) - flags
+    
+    def constraints(self):
+        '''
+        Return a dictionary from frozensets of free cells to the number
+        of mines among them, one for each unsolved cell.
+        
+        See `propagate`.
+        '''
+        constraints = {}
+        for cell in self.unsolved_cells():
+            free, mines = self.constraint(cell)
+            constraints[frozenset(free)] = mines
+        return constraints
+    
+    def components(self, cells):
+        '''
+        Split the unsolved `cells` into components:  Lists of the cells
+        that are connected by sharing free neighbours.  Cells in
+        different components can't affect each other, except through
+        the flags left.
+        
+        The cells are in the same order as in `cells`, and the
+        components are in the order of their first cells.
+        '''
+        # Union-find on the positions in `cells`.
+        parent = list(range(len(cells)))
+        def root(n):
+            while parent[n] != n:
+                parent[n] = parent[parent[n]]
+                n = parent[n]
+            return n
+        owner = {}
+        for n, cell in enumerate(cells):
+            for neighbour in self.field.get_neighbours(cell):
+                if self.field.get(neighbour) is not None:
+                    continue
+                if neighbour in owner:
+                    a = root(owner[neighbour])
+                    b = root(n)
+                    parent[max(a, b)] = min(a, b)
+                else:
+                    owner[neighbour] = n
+        components = {}
+        order = []
+        for n, cell in enumerate(cells):
+            key = root(n)
+            if key not in components:
+                components[key] = []
+                order.append(key)
+            components[key].append(cell)
+        return [components[key] for key in order]
+    
+    def component_key(self, cells):
+        '''
+        Return something hashable that changes when anything that
+        `cell_solver` looks at in the component `cells` changes:  The
+        cells, their free neighbours and the flags left.
+        '''
+        free = set()
+        for cell in cells:
+            free.update(self.constraint(cell)[0])
+        return frozenset(cells), frozenset(free), self.field.flags_left
+    
+    def fewest_mines(self, constraints):
+        '''
+        Return the lowest number of mines that fulfills every
+        constraint in `constraints`, a list of (free cells, mines).
+        None if they can't all be fulfilled.
+        
+        Backtracking over the free cells, with no mine tried before
+        a mine, and giving up on a branch as soon as a constraint
+        can't be fulfilled or it already has as many mines as the
+        best so far.
+        '''
+        cells = []
+        touched = {}
+        for n, (free, mines) in enumerate(constraints):
+            for cell in free:
+                if cell not in touched:
+                    touched[cell] = []
+                    cells.append(cell)
+                touched[cell].append(n)
+        touched = [touched[cell] for cell in cells]
+        needed = [mines for free, mines in constraints]
+        # Free cells left to decide around each constraint.
+        left = [len(free) for free, mines in constraints]
+        value = [None] * len(cells)
+        best = None
+        mines = 0
+        n = 0
+        while n >= 0:
+            if n == len(cells):
+                best = mines
+                n -= 1
+                continue
+            # Undo the last try at `n`.
+            if value[n] is not None:
+                mines -= value[n]
+                for c in touched[n]:
+                    left[c] += 1
+                    needed[c] += value[n]
+            if value[n] == 1:
+                value[n] = None
+                n -= 1
+                continue
+            if value[n] is None:
+                value[n] = 0
+            else:
+                value[n] = 1
+            mines += value[n]
+            possible = best is None or mines < best
+            for c in touched[n]:
+                left[c] -= 1
+                needed[c] -= value[n]
+                if needed[c] < 0 or needed[c] > left[c]:
+                    possible = False
+            if possible:
+                n += 1
+        return best
+    
+    def reduce(self, constraints):
+        '''
+        Compare the `constraints` that share cells.  Returns a list of
+        (difficulty, safe cells, mines).
+        
+        `a` has `ka` mines and `b` has `kb`.  At least
+        ka - len(a - b) of the mines of `a` are in `b`.  If that is all
+        of the mines of `b`, the cells of `b` outside `a` are safe and
+        the cells of `a` outside `b` are mines.
+        
+        If `a` is a subset of `b`, `b - a` has kb - ka mines.  That is
+        a new constraint, which is compared with the others too.
+        
+        If nothing was found and the field counts flags, constraints
+        without common cells are compared with all the free cells
+        together.
+        
+        See `propagate`.
+        '''
+        pool = list(constraints.items())
+        n_given = len(pool)
+        known = set(constraints)
+        by_cell = {}
+        for n, (cells, mines) in enumerate(pool):
+            for cell in cells:
+                by_cell.setdefault(cell, []).append(n)
+        steps = []
+        n = 0
+        while n < len(pool) and not (steps and n >= n_given):
+            a, ka = pool[n]
+            partners = set()
+            for cell in a:
+                partners.update(by_cell[cell])
+            partners.discard(n)
+            for m in partners:
+                b, kb = pool[m]
+                only_a = a - b
+                only_b = b - a
+                if ka - len(only_a) == kb:
+                    if only_a and n < n_given and m < n_given:
+                        steps.append((1, only_b, only_a))
+                    else:
+                        steps.append((5, only_b, only_a))
+                elif not only_a and only_b not in known:
+                    # `a` is a subset of `b`.
+                    known.add(only_b)
+                    for cell in only_b:
+                        by_cell[cell].append(len(pool))
+                    pool.append((only_b, kb - ka))
+            n += 1
+        if steps or self.field.flags_left is None:
+            return steps
+        # Rule 3:  Constraints without common cells have all their
+        # mines, the rest of the free cells have the rest of the flags.
+        union = set()
+        mines = 0
+        for cells, k in pool:
+            if not union & cells:
+                union |= cells
+                mines += k
+        outside = [
+            cell for cell in sum(self.free_cells(), []) if cell not in union
+        ]
+        if outside and mines == self.field.flags_left:
+            return [(7, outside, [])]
+        if outside and self.field.flags_left - mines == len(outside):
+            return [(3, [], outside)]
+        return []
+    
+    def propagate(self):
+        '''
+        Solve what can be solved with the constraints from `constraints`
+        and `reduce`, for the 'constraints' mode of `solver_loop`.
+        
+        Returns a dictionary of the difficulty levels like
+        `solver_loop`.  The levels are the ones `cell_solver` would
+        most likely have needed:
+            0   One constraint:  no mines or nothing but mines.
+            1   Two constraints, mines were found.  (Rules 1 and 2.)
+            5   Two constraints, only safe cells were found, or one of
+                them was found by subtracting a subset.  (Rules 4
+                and 2.)
+            3   The flags left, mines were found.  (Rules 1, 2 and 3.)
+            7   The flags left, only safe cells were found.
+        '''
+        difficulty_levels = {}
+        while True:
+            constraints = self.constraints()
+            steps = []
+            for cells, mines in constraints.items():
+                if mines == 0:
+                    steps.append((0, cells, []))
+                elif mines == len(cells):
+                    steps.append((0, [], cells))
+            if not steps:
+                steps = self.reduce(constraints)
+            progress = False
+            for difficulty, safe, mines in steps:
+                # Some may have been done by an earlier step.
+                mines = [cell for cell in mines if self.field.get(cell) is None]
+                safe = [cell for cell in safe if self.field.get(cell) is None]
+                for cell in mines:
+                    self.field.flag(cell)
+                for cell in safe:
+                    self.field.reveal(cell)
+                if mines or safe:
+                    if difficulty not in difficulty_levels:
+                        difficulty_levels[difficulty] = 0
+                    difficulty_levels[difficulty] += 1
+                    progress = True
+            if not progress:
+                return difficulty_levels
+    
     def solver_loop(self):
         '''
         This will solve the field according to rules 0 to 7.
         
+        In the 'constraints' mode, `propagate` does it instead.
+        
+        The unsolved cells are split into `components` that are solved
+        independently; a component that hasn't changed is not tried
+        again at the levels it has already failed at.
+        
         This function returns True if the field was solved.
         There may still be deserted mines. -- See rule 8.
         
@@ -915,36 +1333,78 @@ class solver():
             
             When used to rank a cell, the cell to be ranked must be
             alone in a list.
+            
+            Each round used to append `number_neighbours` of the whole
+            list to the list, so the number cells are counted again in
+            every round they are found in.  The area is now grown with
+            sets instead, but the count is the same.
             '''
-            more_cells = cells + self.number_neighbours(cells)
-            if i:
-                return rank_cell(more_cells, i - 1)
-            else:
-                return len(more_cells)
+            count = len(cells)
+            area = set(cells)
+            reached = set()
+            new = area
+            while True:
+                for cell in new:
+                    reached.update(self.field.get_neighbours(cell))
+                numbers = [
+                    cell for cell in reached
+                    if self.field.get(cell) not in (None, 'F')
+                ]
+                count += len(numbers)
+                if not i:
+                    return count
+                i -= 1
+                new = set(numbers) - area
+                area.update(new)
+        
+        if self.mode == 'constraints':
+            difficulty_levels = self.propagate()
+            return not self.unsolved_cells(), difficulty_levels
         
         difficulty_levels = {}
+        # The components of the unsolved cells are independent (see
+        # `components`).  A component that hasn't changed (see
+        # `component_key`) since it was tried at a level will not be
+        # confirmed at that level now either, so it is skipped:
+        #   tried[key]      Tried at every level below this one.
+        #   busted          Every cell was 'B'.
+        tried = {}
+        busted = set()
         
         while True:
             i = -1      # The increment is in the beginning of the loop
                         # for readability.
             # Come back to this loop whenever a cell has been confirmed.
             confirmed = False
+            cells = self.unsolved_cells()
+            # Check for success right here.
+            if not cells:
+                return True, difficulty_levels
+            key_of = {}
+            for component in self.components(cells):
+                key = self.component_key(component)
+                for cell in component:
+                    key_of[cell] = key
+            keys = set(key_of.values())
             while not confirmed:
                 i += 1
                 # As the value of `i` increases, the area of clues
                 # increases too.
-                # Recollect and re-sort the list of unsolved cells.
+                # Re-sort the list of unsolved cells.
                 unsolved_cells = []
-                for cell in self.field.all_cells():
-                    if self.unsolved(cell):
+                for cell in cells:
+                    key = key_of[cell]
+                    if key not in busted and tried.get(key, 0) <= i:
                         unsolved_cells.append((cell, rank_cell([cell], i)))
                 unsolved_cells.sort(key=lambda x: x[1], reverse=True)
-                # Check for success right here.
-                if not unsolved_cells:
-                    return True, difficulty_levels
                 # If nothing succeeds before the j loop finishes,
-                # the function will return False.
+                # the function will return False.  The skipped
+                # components that aren't busted were not 'B' here.
                 fail = True
+                for key in keys:
+                    if key not in busted and tried.get(key, 0) > i:
+                        fail = False
+                plausible = set()
                 for j in range(4):
                     for cell, ignored in unsolved_cells:
                         # It may have been solved already.
@@ -952,6 +1412,7 @@ class solver():
                             status = self.cell_solver(cell, 4*i + j)
                             if status != 'B':
                                 fail = False
+                                plausible.add(key_of[cell])
                             if status == 'C':
                                 if (4*i + j) not in difficulty_levels:
                                     difficulty_levels[4*i + j] = 0
@@ -962,6 +1423,14 @@ class solver():
                     # Double break when confirmed.
                     if confirmed:
                         break
+                if confirmed:
+                    break
+                for cell, ignored in unsolved_cells:
+                    key = key_of[cell]
+                    if key in plausible:
+                        tried[key] = i + 1
+                    else:
+                        busted.add(key)
                 if fail:
                     return False, difficulty_levels
     
@@ -1000,66 +1469,36 @@ class solver():
         # Sanity checking.
         if self.field.flags_left is None:
             return False
-        # Find the unsolved cells.
-        unsolved_cells = []
-        for cell in self.field.all_cells():
-            if self.unsolved(cell):
-                unsolved_cells.append(cell)
         # Find the cells to be brute-forced.
         # They are free cells that are neighbours to the unsolved cells.
         # ### AND
         # Find the deserted cells.
         # As per definition: free cells that are not neighbours to
         # unsolved cells.
-        bruteforce_cells = []
-        deserted_cells = []
-        for cell in self.field.all_cells():
-            if self.field.get(cell) is None:
-                for unsolved_cell in unsolved_cells:
-                    if cell in self.field.get_neighbours(unsolved_cell):
-                        bruteforce_cells.append(cell)
-                        break # Fix another bug as well. # 0.0.25
-                else:
-                    # 0.0.25
-                    # The BUG WAS here. The 'else' statement belonged to the
-                    # 'if' statement rather than to the 'for' statement.
-                    # Check the comment at the top of this function.
-                    deserted_cells.append(cell)
+        bruteforce_cells, deserted_cells = self.free_cells()
         
         # Check that there are deserted cells. (Late sanity checking)
         if not len(deserted_cells):
             return False
         
-        # Begin brute-forcing.
-        lowest = None
-        L = len(bruteforce_cells)
-        # 1 <= n <= 2^L - 2
-        # The real ends (0, 2^L - 1) are either impossible or obvious.
-        n = 1
-        stop = (1 << L) - 1
         # Check if it is even possible for any possibility to exist.
-        if L - 1 < self.field.flags_left:
+        # (The real end with every bordering cell a mine is obvious.)
+        if len(bruteforce_cells) - 1 < self.field.flags_left:
             return False
-        while n < stop:
-            # Assemble mines and numbers.
-            possibility = []
-            for i in range(L):
-                if n & (1 << i):
-                    possibility.append(bruteforce_cells[i])
-            # Check if the possibility is possible.
-            if not self.conflict(possibility, True):
-                # Keep track of the min() value of all possibilities
-                # in REAL TIME
-                if lowest is None or len(possibility) < lowest:
-                    lowest = len(possibility)
-                    if lowest < self.field.flags_left:
-                        # One/some of the deserted cells could be a mine.
-                        return False
-            # Next possibility:
-            n += 1
         
-        # Verifying that no possibility could allow mines among the
-        # deserted cells, after brute forcing, was way too slow.
+        # The components don't share any cells, so the lowest number
+        # of mines is the sum of the lowest of each component.  Each
+        # one is brute-forced on its own, instead of 2^L possibilities
+        # of all the bordering cells together.
+        lowest = 0
+        for component in self.components(self.unsolved_cells()):
+            fewest = self.fewest_mines(list(map(self.constraint, component)))
+            if fewest is None:
+                return False
+            lowest += fewest
+        if lowest < self.field.flags_left:
+            # One/some of the deserted cells could be a mine.
+            return False
         
         assert lowest == self.field.flags_left
         
@@ -1104,6 +1543,13 @@ class solver():
         
         NOTE to self:  This is copy-pasted.
         '''
+        if 'neighbours_i' in dir(self.field):
+            field = self.field
+            self.field = index_view(field)
+            try:
+                return self.solve()
+            finally:
+                self.field = field
         
         start_time = time.time()
         
@@ -1116,11 +1562,14 @@ class solver():
             if self.field.flags_left is None:
                 done = True
             else:
-                # Find deserted cells.
-                deserted_cells = []
-                for cell in self.field.all_cells():
-                    if self.field.get(cell) is None:
-                        deserted_cells.append(cell)
+                # Find deserted cells.  (Every free cell.)
+                if 'frontier' in dir(self.field):
+                    deserted_cells = sorted(sum(self.free_cells(), []))
+                else:
+                    deserted_cells = []
+                    for cell in self.field.all_cells():
+                        if self.field.get(cell) is None:
+                            deserted_cells.append(cell)
                 if success:
                     # Rule 8.
                     if len(deserted_cells):
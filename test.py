@@ -13,6 +13,41 @@
 `run623` is a generic field of 6x6x6 with 22 mines.
 
 `run10` appears to be collecting some statistics of a 16x16 with 40 mines.
+
+`bench_storage` measures the memory used by a field and how many
+clear+fill+reveal cycles (like the ones in `init_field2`) it can do per
+second.
+    bench_storage(x=100, y=100, m=2000, runs=20)
+
+`bench_reseed` compares clear+fill+reveal with `reseed_i` for the
+retry loop in `init_field2`.
+    bench_reseed(x=30, y=16, m=99, runs=2000)
+
+`bench_numpy` times `fill` and a zero region `reveal` with and without
+NumPy on a Moore and a hexagonal field.
+    bench_numpy(x=100, y=100, m=1000, runs=20)
+
+`bench_bitboard` does the same for `bitboard_field` against the pure
+Python `generic_field`.
+    bench_bitboard(x=100, y=100, m=1000, runs=20)
+
+`bench_solve` times the solver on large fields, where finding the
+unsolved cells used to dominate.
+    bench_solve(x=60, y=60, m=450, runs=3)
+
+`bench_dimensions` compares the cost per cell of compiling the
+neighbourhoods and of clear+fill+reveal on 2D, 3D and 4D fields of about
+the same size.
+    bench_dimensions(n=20000, density=0.1, runs=20)
+
+`bench_share` compares what a worker process pays to get a copy of a
+field from `loads` with attaching to it in shared memory (Python 3.8+).
+    bench_share(x=300, y=300, m=18000, runs=20)
+
+`bench_modes` times the 'possibilities' and the 'constraints' modes of
+the solver on the same fields and counts the fields only one of them
+could solve.
+    bench_modes(x=30, y=16, m=99, runs=50)
 '''
 
 import time
@@ -114,7 +149,7 @@ def run623():
     solver.field = field
     ret = solver.solve()
     if ret[0]:
-        print(field.field)
+        print(field)
     print(ret)
 
 def runneumann(x=78, y=18, m=225):
@@ -216,6 +251,231 @@ def init_time(width, height, n_mines, runs=10):
     return times
 
 
+def bench_storage(x=100, y=100, m=2000, runs=20):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None      # Python < 3.4
+    if tracemalloc is not None:
+        tracemalloc.start()
+    field = anonymine_fields.generic_field([x, y])
+    if tracemalloc is not None:
+        empty = tracemalloc.get_traced_memory()[0]
+    cells = field.all_cells()
+    if tracemalloc is not None:
+        cells_size = tracemalloc.get_traced_memory()[0] - empty
+    random.shuffle(cells)
+    field.fill(cells[:m])
+    field.reveal(cells[m])
+    if tracemalloc is not None:
+        filled = tracemalloc.get_traced_memory()[0] - cells_size
+        tracemalloc.stop()
+        sys.stderr.write('{0}x{1}: {2} bytes/cell empty, {3} filled\n'.format(
+            x, y, empty//(x*y), filled//(x*y)
+        ))
+    start = time.time()
+    for i in range(runs):
+        random.shuffle(cells)
+        field.clear()
+        field.fill(cells[:m])
+        field.reveal(cells[m])
+    delta = time.time() - start
+    sys.stderr.write('{0}@{1}x{2}: {3} clear+fill+reveal per second\n'.format(
+        m, x, y, runs/delta
+    ))
+    return runs/delta
+
+
+def bench_reseed(x=30, y=16, m=99, runs=2000):
+    field = anonymine_fields.generic_field([x, y])
+    startpoint = (x//2, y//2)
+    safe = field.get_neighbours(startpoint) + [startpoint]
+    cells = [cell for cell in field.all_cells() if cell not in safe]
+    rng = random.Random(0)
+    samples = [rng.sample(cells, m) for i in range(runs)]
+    start = time.time()
+    for mines in samples:
+        field.clear()
+        field.fill(mines)
+        field.reveal(startpoint)
+    old = runs/(time.time() - start)
+    # `init_field2` works with flat indices.
+    samples = [list(map(field.index_of, mines)) for mines in samples]
+    startpoint = field.index_of(startpoint)
+    start = time.time()
+    for mines in samples:
+        field.reseed_i(mines, startpoint)
+    new = runs/(time.time() - start)
+    sys.stderr.write(
+        '{0}@{1}x{2}: {3:.0f} clear+fill+reveal, {4:.0f} reseed per second\n'
+        .format(m, x, y, old, new)
+    )
+
+def bench_numpy(x=100, y=100, m=1000, runs=20):
+    if anonymine_fields.numpy is None:
+        sys.stderr.write('NumPy is not installed, timing pure Python only\n')
+        modes = [False]
+    else:
+        modes = [False, True]
+    fields = [
+        ('Moore', anonymine_fields.generic_field([x, y])),
+        ('hex', anonymine_fields.hexagonal_field(x, y)),
+    ]
+    for name, field in fields:
+        cells = field.all_cells()
+        for accelerated in modes:
+            field.accelerated = accelerated
+            fill_time = reveal_time = 0
+            for i in range(runs):
+                random.seed(i)
+                random.shuffle(cells)
+                field.clear()
+                start = time.time()
+                field.fill(cells[:m])
+                fill_time += time.time() - start
+                # Reveal the biggest region there is: start at a zero.
+                for cell in cells[m:]:
+                    if field.numbers[field.index_of(cell)] == 0:
+                        break
+                start = time.time()
+                field.reveal(cell)
+                reveal_time += time.time() - start
+            sys.stderr.write(
+                '{0} {1}@{2}x{3} {4}: fill {5:.2f} ms, reveal {6:.2f} ms\n'
+                .format(
+                    name, m, x, y, ['Python', 'NumPy'][accelerated],
+                    1000*fill_time/runs, 1000*reveal_time/runs,
+                )
+            )
+
+def bench_bitboard(x=100, y=100, m=1000, runs=20):
+    for moore in (True, False):
+        plain = anonymine_fields.generic_field([x, y], moore)
+        plain.accelerated = False
+        fields = [
+            ('generic_field', plain),
+            ('bitboard_field', anonymine_fields.bitboard_field([x, y], moore)),
+        ]
+        for name, field in fields:
+            cells = field.all_cells()
+            fill_time = reveal_time = 0
+            for i in range(runs):
+                random.seed(i)
+                random.shuffle(cells)
+                field.clear()
+                start = time.time()
+                field.fill(cells[:m])
+                fill_time += time.time() - start
+                for cell in cells[m:]:
+                    if field.numbers[field.index_of(cell)] == 0:
+                        break
+                start = time.time()
+                field.reveal(cell)
+                reveal_time += time.time() - start
+            sys.stderr.write(
+                '{0} {1} {2}@{3}x{4}: fill {5:.2f} ms, reveal {6:.2f} ms\n'
+                .format(
+                    name, ['Neumann', 'Moore'][moore], m, x, y,
+                    1000*fill_time/runs, 1000*reveal_time/runs,
+                )
+            )
+
+def bench_solve(x=60, y=60, m=450, runs=3):
+    field = anonymine_fields.generic_field([x, y])
+    solver = anonymine_solver.solver()
+    solver.field = field
+    start = field.index_of((x//2, y//2))
+    safe = set(field.neighbours_i(start) + [start])
+    cells = [index for index in range(field.n_cells) if index not in safe]
+    total = 0
+    for i in range(runs):
+        field.reseed_i(random.Random(i).sample(cells, m), start)
+        begin = time.time()
+        won, levels = solver.solve()
+        total += time.time() - begin
+        sys.stderr.write('{0}@{1}x{2}: {3} in {4:.2f} s\n'.format(
+            m, x, y, ['lost', 'won'][won], time.time() - begin
+        ))
+    sys.stderr.write('Average: {0:.2f} s\n'.format(total/runs))
+
+def bench_dimensions(n=20000, density=0.1, runs=20):
+    for n_dimensions in (2, 3, 4):
+        size = int(round(n ** (1.0 / n_dimensions)))
+        dimensions = [size] * n_dimensions
+        # Compile the neighbourhoods from scratch.
+        anonymine_fields._topologies.clear()
+        begin = time.time()
+        field = anonymine_fields.generic_field(dimensions)
+        compiling = time.time() - begin
+        cells = list(range(field.n_cells))
+        m = int(density * field.n_cells)
+        begin = time.time()
+        for i in range(runs):
+            random.shuffle(cells)
+            field.clear()
+            field.fill_i(cells[:m])
+            for index in cells[m:]:
+                if not field.get_i(index):
+                    field.reveal_i(index)
+        playing = (time.time() - begin) / runs
+        sys.stderr.write(
+            '{0}: {1:.2f} us/cell compile, '
+            '{2:.2f} us/cell clear+fill+reveal\n'.format(
+                'x'.join(map(str, dimensions)),
+                1e6 * compiling / field.n_cells,
+                1e6 * playing / field.n_cells,
+            )
+        )
+
+def bench_share(x=300, y=300, m=18000, runs=20):
+    field = anonymine_fields.generic_field([x, y])
+    start = (x//2, y//2)
+    cells = [cell for cell in field.all_cells() if cell != start]
+    field.fill(random.sample(cells, m))
+    field.reveal(start)
+    data = field.dumps()
+    image = field.share()
+    begin = time.time()
+    for i in range(runs):
+        copy = anonymine_fields.loads(data)
+    loading = (time.time() - begin) / runs
+    begin = time.time()
+    for i in range(runs):
+        worker = anonymine_fields.attach(image.name)
+        view = worker.view()
+        del view
+        worker.close()
+    attaching = (time.time() - begin) / runs
+    image.close()
+    image.unlink()
+    sys.stderr.write('loads: {0:.2f} ms, attach+view: {1:.2f} ms\n'.format(
+        1e3 * loading, 1e3 * attaching
+    ))
+
+def bench_modes(x=30, y=16, m=99, runs=50):
+    field = anonymine_fields.generic_field([x, y])
+    start = field.index_of((x//2, y//2))
+    safe = set(field.neighbours_i(start) + [start])
+    cells = [index for index in range(field.n_cells) if index not in safe]
+    results = {}
+    for mode in ('possibilities', 'constraints'):
+        solver = anonymine_solver.solver()
+        solver.mode = mode
+        solver.field = field
+        results[mode] = []
+        begin = time.time()
+        for i in range(runs):
+            field.reseed_i(random.Random(i).sample(cells, m), start)
+            results[mode].append(solver.solve()[0])
+        sys.stderr.write('{0}: {1} of {2} won in {3:.2f} s\n'.format(
+            mode, sum(results[mode]), runs, time.time() - begin
+        ))
+    different = [
+        i for i in range(runs)
+        if results['possibilities'][i] != results['constraints'][i]
+    ]
+    sys.stderr.write('Different results: {0}\n'.format(different))
+
 def run2(path):
     f = open(path, 'w')
     data = {